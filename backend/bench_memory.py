@@ -0,0 +1,103 @@
+"""
+Memory benchmark: bytes per tool and per step with plain pydantic dicts vs the compact record stores.
+
+    python bench_memory.py [entities]
+
+Strings are rebuilt for every entity (as they would be when parsed from requests or
+model output) so interning in the compact store is measured honestly.
+"""
+import gc
+import random
+import sys
+import tracemalloc
+import uuid
+from models import Tool, Project, ProjectStep, ToolCondition, ProjectStatus
+from compact_store import tool_store, project_store
+
+CATEGORIES = ["Hand Tools", "Power Tools", "Measuring Tools", "Plumbing Tools", "Electrical", "Painting", "Safety", "Garden"]
+CONDITIONS = list(ToolCondition)
+WORDS = "sand paint drill cut measure screw bolt tile grout caulk wire pipe valve shelf bracket anchor level stud beam joist".split()
+STEPS_PER_PROJECT = 50
+
+
+def fresh(text: str) -> str:
+    """A new string object with the same contents, like one decoded from JSON"""
+    return "".join(list(text))
+
+
+def make_tools(count: int):
+    rng = random.Random(1)
+    for i in range(count):
+        keyword = rng.choice(WORDS)
+        yield Tool(
+            id=str(uuid.uuid4()),
+            name=fresh(f"{keyword.title()} {i % 500}"),
+            category=fresh(rng.choice(CATEGORIES)),
+            quantity=rng.randint(1, 5),
+            condition=rng.choice(CONDITIONS),
+            icon_keywords=[fresh(keyword)],
+            properties={},
+        )
+
+
+def make_projects(step_count: int, tool_ids):
+    rng = random.Random(2)
+    for p in range(step_count // STEPS_PER_PROJECT):
+        steps = [
+            ProjectStep(
+                id=str(uuid.uuid4()),
+                step_number=i + 1,
+                title=fresh(" ".join(rng.sample(WORDS, 3)).capitalize()),
+                description=fresh(" ".join(rng.choices(WORDS, k=30))),
+                required_tools=[fresh(rng.choice(tool_ids)) for _ in range(rng.randint(0, 3))],
+                is_active=i == 0,
+            )
+            for i in range(STEPS_PER_PROJECT)
+        ]
+        yield Project(
+            id=str(uuid.uuid4()),
+            title=fresh(f"Project {p}"),
+            description=fresh(" ".join(rng.choices(WORDS, k=20))),
+            status=ProjectStatus.IN_PROGRESS,
+            created_at="2026-01-01T00:00:00",
+            current_step=1,
+            total_steps=STEPS_PER_PROJECT,
+            steps=steps,
+        )
+
+
+def measure(build) -> int:
+    """Bytes still allocated after build() returns its container"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    container = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del container
+    return used
+
+
+def fill(store, models):
+    for model in models:
+        store[model.id] = model
+    return store
+
+
+def main(count: int):
+    tool_ids = [str(uuid.uuid4()) for _ in range(200)]
+    results = [
+        ("tools", "pydantic dict", measure(lambda: fill({}, make_tools(count)))),
+        ("tools", "compact store", measure(lambda: fill(tool_store(), make_tools(count)))),
+        ("steps", "pydantic dict", measure(lambda: fill({}, make_projects(count, tool_ids)))),
+        ("steps", "compact store", measure(lambda: fill(project_store(), make_projects(count, tool_ids)))),
+    ]
+    print(f"{count} entities per collection ({STEPS_PER_PROJECT} steps per project)")
+    print(f"{'entity':<8}{'storage':<16}{'total MB':>10}{'bytes/entity':>14}")
+    for entity, storage, used in results:
+        print(f"{entity:<8}{storage:<16}{used / 1e6:>10.1f}{used / count:>14.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,83 @@
+"""
+Startup benchmark: import time of the app, time until /health answers and time until /ready.
+
+    python bench_startup.py [runs]
+
+Runs uvicorn in a subprocess against whatever Ollama the environment points at
+(OLLAMA_BASE_URLS / localhost:11434). Set DIYBOT_WARMUP=0 to skip model preloading.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import urllib.error
+
+# Targets: importing the app stays well under half a second, and a liveness probe
+# answers within 1.5 s of the process starting, independent of model load time.
+IMPORT_TARGET_S = 0.5
+HEALTH_TARGET_S = 1.5
+READY_TIMEOUT_S = 300
+
+
+def import_time() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, started: float, timeout: float):
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def serve_times():
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        health = wait_for(f"http://127.0.0.1:{port}/health", started, 30)
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", started, READY_TIMEOUT_S) if health else None
+        return health, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(runs: int):
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    imports = sorted(import_time() for _ in range(runs))
+    serves = [serve_times() for _ in range(runs)]
+    health = sorted(h for h, _ in serves if h is not None)
+    ready = sorted(r for _, r in serves if r is not None)
+
+    def median(values):
+        return f"{values[len(values) // 2]:.3f}s" if values else "n/a"
+
+    print(f"import main      median {median(imports)}  (target < {IMPORT_TARGET_S}s)")
+    print(f"/health answers  median {median(health)}  (target < {HEALTH_TARGET_S}s)")
+    print(f"/ready answers   median {median(ready)}  ({len(ready)}/{runs} runs became ready)")
+    ok = imports and health and imports[len(imports) // 2] < IMPORT_TARGET_S and health[len(health) // 2] < HEALTH_TARGET_S
+    print("targets met" if ok else "targets NOT met")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,177 @@
+"""
+Wire benchmark: bytes per session and serialization CPU of the old response path vs the current one.
+
+    python bench_wire.py [tools] [turns]
+
+A session loads the tool, house object and project lists, generates one plan and
+chats for a number of turns. "before" is the previous path: jsonable_encoder +
+json.dumps and no HTTP compression, one /ws frame per reply with a JSON-string timestamp.
+uvicorn negotiated permessage-deflate (with context takeover) both before and after,
+so /ws bytes are compared deflated on both sides. Token streaming is opt-in and
+costs bytes: it is reported separately rather than folded into the default session.
+"""
+import json
+import random
+import sys
+import timeit
+import uuid
+import zlib
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+from models import Tool, HouseObject, Project, ProjectStep, ToolCondition, ProjectStatus
+import wire
+
+WORDS = ("sand paint drill cut measure screw bolt tile grout caulk wire pipe valve shelf bracket "
+         "anchor level stud beam joist the a with and then until make sure your before").split()
+CATEGORIES = ["Hand Tools", "Power Tools", "Measuring Tools", "Plumbing Tools"]
+PROJECTS = 10
+STEPS_PER_PROJECT = 12
+TOKENS_PER_REPLY = 150
+
+
+def make_state(tool_count: int):
+    rng = random.Random(1)
+    tools = [
+        Tool(id=str(uuid.UUID(int=rng.getrandbits(128))), name=f"{rng.choice(WORDS).title()} {i}",
+             category=rng.choice(CATEGORIES), quantity=rng.randint(1, 3), condition=ToolCondition.WORKING,
+             icon_keywords=[rng.choice(WORDS)], properties={})
+        for i in range(tool_count)
+    ]
+    house_objects = [
+        HouseObject(id=str(uuid.UUID(int=rng.getrandbits(128))), name=f"Object {i}", location="Kitchen", type="fixture", properties={})
+        for i in range(tool_count // 4)
+    ]
+    projects = []
+    for p in range(PROJECTS):
+        steps = [
+            ProjectStep(id=f"step_{i + 1}", step_number=i + 1, title=" ".join(rng.sample(WORDS, 4)).capitalize(),
+                        description=" ".join(rng.choices(WORDS, k=60)),
+                        required_tools=[rng.choice(tools).id for _ in range(2)], is_active=i == 0)
+            for i in range(STEPS_PER_PROJECT)
+        ]
+        projects.append(Project(id=str(uuid.UUID(int=rng.getrandbits(128))), title=f"Project {p}",
+                                description=" ".join(rng.choices(WORDS, k=20)), status=ProjectStatus.IN_PROGRESS,
+                                created_at="2026-01-01T00:00:00", current_step=1, total_steps=STEPS_PER_PROJECT, steps=steps))
+    return tools, house_objects, projects
+
+
+def make_replies(turns: int):
+    rng = random.Random(2)
+    # Ollama streams roughly one word-piece per chunk
+    return [[rng.choice(WORDS) + " " for _ in range(TOKENS_PER_REPLY)] for _ in range(turns)]
+
+
+def rest_payloads(tools, house_objects, projects):
+    return {
+        "/api/tools": tools,
+        "/api/house-objects": house_objects,
+        "/api/projects": projects,
+        "generate-steps": {"project_id": projects[0].id, "steps": projects[0].steps, "status": "steps_generated"},
+    }
+
+
+def before_rest(payload) -> bytes:
+    return JSONResponse(None).render(jsonable_encoder(payload))
+
+
+def after_rest(payload) -> bytes:
+    return wire.FastJSONResponse(None).render(payload)
+
+
+def http_compressed(body: bytes, encoding: str) -> int:
+    if len(body) < wire.COMPRESSION_MIN_SIZE:
+        return len(body)
+    compressor = wire._Compressor(encoding)
+    return len(compressor.chunk(body) + compressor.finish())
+
+
+def ws_frame_bytes(frames, deflate: bool) -> int:
+    """Payload plus server-to-client frame header, optionally permessage-deflated"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+    total = 0
+    for frame in frames:
+        data = frame.encode()
+        if deflate:
+            # RFC 7692: each message ends with a sync flush whose 4-byte tail is stripped
+            data = (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH))[:-4]
+        total += len(data) + (2 if len(data) < 126 else 4 if len(data) < 65536 else 10)
+    return total
+
+
+def before_frames(replies):
+    return [json.dumps({"type": "ai_response", "content": "".join(tokens), "timestamp": json.dumps({"timestamp": "now"})})
+            for tokens in replies]
+
+
+def reply_frames(replies, compact: bool):
+    frames = []
+    for tokens in replies:
+        frames.append(wire.encode_frame({"type": "ai_response", "content": "".join(tokens), "timestamp": wire.timestamp_ms()}, compact))
+    return frames
+
+
+def streamed_frames(replies, compact: bool):
+    # Worst case: every chunk gets its own frame (no coalescing)
+    frames = []
+    for tokens in replies:
+        frames.extend(wire.encode_token_frame(token, compact) for token in tokens)
+        if compact:
+            frames.append(wire.encode_frame({"type": "ai_response_end", "timestamp": wire.timestamp_ms()}, compact=True))
+        else:
+            frames.append(wire.encode_frame({"type": "ai_response", "content": "".join(tokens), "timestamp": wire.timestamp_ms()}))
+    return frames
+
+
+def cpu_us(fn, number: int = 20) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def main(tool_count: int, turns: int):
+    tools, house_objects, projects = make_state(tool_count)
+    payloads = rest_payloads(tools, house_objects, projects)
+    replies = make_replies(turns)
+    encodings = ["gzip"] + (["br"] if wire.brotli is not None else [])
+
+    print(f"{tool_count} tools, {PROJECTS} projects x {STEPS_PER_PROJECT} steps, {turns} chat turns of {TOKENS_PER_REPLY} tokens")
+    print(f"\nREST{'':<18}{'before B':>10}{'after B':>10}" + "".join(f"{e + ' B':>10}" for e in encodings)
+          + f"{'before us':>11}{'after us':>10}")
+    rest_before = rest_after = 0
+    for name, payload in payloads.items():
+        old, new = before_rest(payload), after_rest(payload)
+        assert json.loads(old) == json.loads(new), name
+        compressed = [http_compressed(new, e) for e in encodings]
+        rest_before += len(old)
+        rest_after += compressed[-1]
+        print(f"{name:<22}{len(old):>10}{len(new):>10}" + "".join(f"{c:>10}" for c in compressed)
+              + f"{cpu_us(lambda: before_rest(payload)):>11.0f}{cpu_us(lambda: after_rest(payload)):>10.0f}")
+
+    print(f"\nWebSocket{'':<30}{'frames':>8}{'raw B':>10}{'deflate B':>11}{'encode us':>11}")
+    ws_cpu = {}
+    ws_rows = [
+        ("before: reply frames", before_frames, replies),
+        ("after: reply frames", lambda r: reply_frames(r, compact=False), replies),
+        ("after: reply frames, compact", lambda r: reply_frames(r, compact=True), replies),
+        ("after: streamed tokens", lambda r: streamed_frames(r, compact=False), replies),
+        ("after: streamed tokens, compact", lambda r: streamed_frames(r, compact=True), replies),
+    ]
+    ws_bytes = {}
+    for label, build, data in ws_rows:
+        frames = build(data)
+        raw, deflated = ws_frame_bytes(frames, False), ws_frame_bytes(frames, True)
+        ws_bytes[label] = (raw, deflated)
+        ws_cpu[label] = cpu_us(lambda: build(data), number=5)
+        print(f"{label:<39}{len(frames):>8}{raw:>10}{deflated:>11}{ws_cpu[label]:>11.0f}")
+
+    ws_before = ws_bytes["before: reply frames"][1]
+    print("\nbytes per session (REST + deflated /ws)")
+    print(f"  before                          {rest_before:>8} + {ws_before:>6} = {rest_before + ws_before}")
+    for label in ("after: reply frames", "after: reply frames, compact", "after: streamed tokens, compact"):
+        ws_after = ws_bytes[label][1]
+        change = (ws_after - ws_before) / ws_before * 100
+        print(f"  {label[7:]:<31} {rest_after:>8} + {ws_after:>6} = {rest_after + ws_after}"
+              f"   (/ws {change:+.0f}%, encode {ws_cpu[label] / ws_cpu['before: reply frames']:.1f}x before)")
+    print(f"  REST saves {rest_before - rest_after} B; streaming sends one frame per token, so its /ws bytes are a regression")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
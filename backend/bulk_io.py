@@ -0,0 +1,226 @@
+import csv
+import json
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel, ValidationError
+from models import Tool, HouseObject, ToolCondition
+
+# Rows are validated, deduped and committed this many at a time
+DEFAULT_CHUNK_SIZE = 500
+# Cap on per-row errors echoed back in the import summary
+MAX_REPORTED_ERRORS = 100
+
+TOOL_COLUMNS = {"name", "category", "quantity", "condition", "icon_keywords", "properties"}
+HOUSE_OBJECT_COLUMNS = {"name", "location", "type", "properties"}
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a streamed request body into text lines without buffering the whole body.
+    A leading UTF-8 byte order mark (added by Excel to CSV exports) is dropped.
+    """
+    buffer = b""
+    first = True
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+            first = False
+    if buffer:
+        yield buffer.decode("utf-8-sig" if first else "utf-8").rstrip("\r")
+
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Yield (line_number, row, error) for each non-blank NDJSON line"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _ends_in_quoted_field(line: str, in_quotes: bool) -> bool:
+    """
+    Whether a CSV record is still inside a quoted field at the end of this line.
+    Like csv.reader, only a quote at the start of a field opens one; elsewhere
+    (e.g. the inch mark in `6" Clamp`) it is a literal character.
+    """
+    at_field_start = not in_quotes
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if in_quotes:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    in_quotes = False
+        elif char == '"' and at_field_start:
+            in_quotes = True
+        at_field_start = not in_quotes and char == ","
+        i += 1
+    return in_quotes
+
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Yield (line_number, row, error) for each CSV record; the first record is the header.
+    Quoted fields may span lines - physical lines are joined while a quoted field is open.
+    """
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    in_quotes = False
+    start_line = 0
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not pending:
+            start_line = line_number
+        pending.append(line)
+        in_quotes = _ends_in_quoted_field(line, in_quotes)
+        if in_quotes:
+            continue
+        record_text = "\n".join(pending)
+        pending = []
+        if not record_text.strip():
+            continue
+        values = next(csv.reader([record_text]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield start_line, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield start_line, dict(zip(header, values)), None
+    if pending:
+        yield start_line, None, "Unterminated quoted field"
+
+
+def _split_keywords(value) -> Optional[List[str]]:
+    if value is None or isinstance(value, list):
+        return value
+    return [keyword.strip() for keyword in str(value).split(";") if keyword.strip()]
+
+
+def _extra_properties(row: Dict, known_columns: set) -> Dict[str, str]:
+    """Collect the row's properties, folding unknown CSV columns into them"""
+    properties = row.get("properties") or {}
+    if isinstance(properties, str):
+        properties = json.loads(properties) if properties.strip() else {}
+    properties = {str(k): str(v) for k, v in properties.items()}
+    for key, value in row.items():
+        if key not in known_columns and value not in (None, ""):
+            properties[key] = str(value)
+    return properties
+
+
+def tool_from_row(row: Dict) -> Tool:
+    """Build a Tool from an import row, applying the same defaults as POST /api/tools"""
+    return Tool(
+        id=str(uuid.uuid4()),
+        name=(row.get("name") or "").strip(),
+        category=row.get("category") or "General",
+        quantity=1 if row.get("quantity") in (None, "") else row.get("quantity"),
+        condition=ToolCondition(row.get("condition") or "working"),
+        icon_keywords=_split_keywords(row.get("icon_keywords")) or [],
+        properties=_extra_properties(row, TOOL_COLUMNS),
+    )
+
+
+def house_object_from_row(row: Dict) -> HouseObject:
+    """Build a HouseObject from an import row"""
+    return HouseObject(
+        id=str(uuid.uuid4()),
+        name=(row.get("name") or "").strip(),
+        location=row.get("location") or "Unknown",
+        type=row.get("type") or "General",
+        properties=_extra_properties(row, HOUSE_OBJECT_COLUMNS),
+    )
+
+
+async def bulk_import(
+    rows: AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]],
+    build: Callable[[Dict], BaseModel],
+    key: Callable[[BaseModel], str],
+    name_index: Dict[str, str],
+    commit: Callable[[BaseModel], BaseModel],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    on_progress: Optional[Callable[[Dict], Awaitable[None]]] = None,
+) -> Dict:
+    """
+    Validate, dedupe and commit streamed rows in chunks.
+
+    Rows whose key is already in `name_index` (or earlier in the same import) are
+    skipped. Only one chunk of validated models is held in memory at a time.
+    """
+    summary = {"processed": 0, "added": 0, "skipped": 0, "failed": 0, "chunks": 0, "errors": []}
+    chunk: List[Tuple[int, Optional[Dict], Optional[str]]] = []
+
+    def record_error(line_number: int, message: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+            summary["errors"].append({"line": line_number, "error": message})
+
+    async def flush():
+        seen_in_chunk = set()
+        valid = []
+        for line_number, row, error in chunk:
+            summary["processed"] += 1
+            if error:
+                record_error(line_number, error)
+                continue
+            try:
+                model = build(row)
+            except (ValidationError, ValueError, TypeError, AttributeError) as e:
+                record_error(line_number, str(e))
+                continue
+            if not model.name:
+                record_error(line_number, "Missing name")
+                continue
+            model_key = key(model)
+            if model_key in name_index or model_key in seen_in_chunk:
+                summary["skipped"] += 1
+                continue
+            seen_in_chunk.add(model_key)
+            valid.append(model)
+
+        for model in valid:
+            commit(model)
+        summary["added"] += len(valid)
+        summary["chunks"] += 1
+        chunk.clear()
+
+        print(f"Bulk import progress: {summary['processed']} processed, {summary['added']} added, {summary['skipped']} skipped, {summary['failed']} failed")
+        if on_progress:
+            await on_progress({k: v for k, v in summary.items() if k != "errors"})
+
+    async for entry in rows:
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+
+    return summary
+
+
+def iter_ndjson_export(db: Dict[str, BaseModel]) -> Iterable[str]:
+    """
+    Serialize a collection as NDJSON one record at a time.
+    Iterates over a snapshot of the ids so concurrent inserts don't break the stream.
+    """
+    for item_id in list(db.keys()):
+        item = db.get(item_id)
+        if item is None:
+            continue
+        yield item.model_dump_json() + "\n"
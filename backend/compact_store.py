@@ -0,0 +1,238 @@
+import sys
+from array import array
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+from models import Tool, HouseObject, Project, ProjectStep, ToolCondition, ProjectStatus
+
+# Internal storage for the MCP server's collections. Records are slotted and share
+# interned strings (categories, locations, tool IDs referenced by many steps);
+# pydantic models are only materialized when a caller reads an entry.
+
+_intern = sys.intern
+
+
+def _pack_list(values: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    return tuple(_intern(v) for v in values) if values is not None else None
+
+
+def _unpack_list(values: Optional[Tuple[str, ...]]) -> Optional[List[str]]:
+    return list(values) if values is not None else None
+
+
+def _pack_dict(values: Optional[Dict[str, str]]) -> Optional[Tuple[Tuple[str, str], ...]]:
+    return tuple((_intern(k), v) for k, v in values.items()) if values is not None else None
+
+
+def _unpack_dict(values: Optional[Tuple[Tuple[str, str], ...]]) -> Optional[Dict[str, str]]:
+    return dict(values) if values is not None else None
+
+
+class ToolRecord:
+    __slots__ = ("id", "name", "category", "quantity", "condition", "icon_keywords", "properties")
+
+    @classmethod
+    def from_model(cls, tool: Tool) -> "ToolRecord":
+        record = cls()
+        record.id = tool.id
+        record.name = _intern(tool.name)
+        record.category = _intern(tool.category)
+        record.quantity = tool.quantity
+        record.condition = ToolCondition(tool.condition)
+        record.icon_keywords = _pack_list(tool.icon_keywords)
+        record.properties = _pack_dict(tool.properties)
+        return record
+
+    def to_model(self) -> Tool:
+        # Records were validated on the way in, so skip validation on the way out
+        return Tool.model_construct(
+            id=self.id,
+            name=self.name,
+            category=self.category,
+            quantity=self.quantity,
+            condition=self.condition,
+            icon_keywords=_unpack_list(self.icon_keywords),
+            properties=_unpack_dict(self.properties),
+        )
+
+
+class HouseObjectRecord:
+    __slots__ = ("id", "name", "location", "type", "properties")
+
+    @classmethod
+    def from_model(cls, obj: HouseObject) -> "HouseObjectRecord":
+        record = cls()
+        record.id = obj.id
+        record.name = _intern(obj.name)
+        record.location = _intern(obj.location)
+        record.type = _intern(obj.type)
+        record.properties = _pack_dict(obj.properties)
+        return record
+
+    def to_model(self) -> HouseObject:
+        return HouseObject.model_construct(
+            id=self.id,
+            name=self.name,
+            location=self.location,
+            type=self.type,
+            properties=_unpack_dict(self.properties),
+        )
+
+
+# Bit flags in StepColumns.flags
+_ACTIVE = 1
+_COMPLETED = 2
+
+
+class StepColumns:
+    """A project's steps stored column-wise: one list/array per field instead of one object per step"""
+
+    __slots__ = ("ids", "numbers", "titles", "descriptions", "required_tools", "missing_tools", "flags")
+
+    def __init__(self, steps: List[ProjectStep]):
+        self.ids = [step.id for step in steps]
+        self.numbers = array("I", (step.step_number for step in steps))
+        self.titles = [step.title for step in steps]
+        self.descriptions = [step.description for step in steps]
+        self.required_tools = [tuple(_intern(t) for t in step.required_tools) for step in steps]
+        self.missing_tools = [tuple(_intern(t) for t in step.missing_tools) for step in steps]
+        self.flags = bytearray((_ACTIVE if step.is_active else 0) | (_COMPLETED if step.is_completed else 0) for step in steps)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def is_completed(self, i: int) -> bool:
+        return bool(self.flags[i] & _COMPLETED)
+
+    def activate(self, i: int):
+        self.flags[i] |= _ACTIVE
+
+    def first_editable(self, current_step: Optional[int]) -> int:
+        """Index of the first step after the current one that isn't completed"""
+        position = current_step or 0
+        while position < len(self.ids) and self.is_completed(position):
+            position += 1
+        return position
+
+    def splice(self, start: int, end: int, steps: List[ProjectStep]):
+        """Replace steps[start:end] in place and renumber from `start` on; earlier steps aren't touched"""
+        new = StepColumns(steps)
+        self.ids[start:end] = new.ids
+        self.numbers[start:end] = new.numbers
+        self.titles[start:end] = new.titles
+        self.descriptions[start:end] = new.descriptions
+        self.required_tools[start:end] = new.required_tools
+        self.missing_tools[start:end] = new.missing_tools
+        self.flags[start:end] = new.flags
+        for i in range(start, len(self.ids)):
+            self.numbers[i] = i + 1
+
+    def to_model(self, i: int) -> ProjectStep:
+        return ProjectStep.model_construct(
+            id=self.ids[i],
+            step_number=self.numbers[i],
+            title=self.titles[i],
+            description=self.descriptions[i],
+            required_tools=list(self.required_tools[i]),
+            missing_tools=list(self.missing_tools[i]),
+            is_active=bool(self.flags[i] & _ACTIVE),
+            is_completed=bool(self.flags[i] & _COMPLETED),
+        )
+
+    def to_models(self) -> List[ProjectStep]:
+        return [self.to_model(i) for i in range(len(self.ids))]
+
+    def find(self, step_id: str) -> Optional[ProjectStep]:
+        """One step by ID, without materializing the others"""
+        try:
+            return self.to_model(self.ids.index(step_id))
+        except ValueError:
+            return None
+
+
+class ProjectRecord:
+    __slots__ = ("id", "title", "description", "status", "created_at", "completed_at",
+                 "current_step", "total_steps", "steps", "initial_ai_message")
+
+    @classmethod
+    def from_model(cls, project: Project) -> "ProjectRecord":
+        record = cls()
+        record.id = project.id
+        record.title = project.title
+        record.description = project.description
+        record.status = ProjectStatus(project.status)
+        record.created_at = project.created_at
+        record.completed_at = project.completed_at
+        record.current_step = project.current_step
+        record.total_steps = project.total_steps
+        record.steps = StepColumns(project.steps)
+        record.initial_ai_message = project.initial_ai_message
+        return record
+
+    def to_model(self) -> Project:
+        return Project.model_construct(
+            id=self.id,
+            title=self.title,
+            description=self.description,
+            status=self.status,
+            created_at=self.created_at,
+            completed_at=self.completed_at,
+            current_step=self.current_step,
+            total_steps=self.total_steps,
+            steps=self.steps.to_models(),
+            initial_ai_message=self.initial_ai_message,
+        )
+
+
+M = TypeVar("M")
+R = TypeVar("R")
+
+
+class RecordStore(MutableMapping, Generic[M, R]):
+    """
+    Dict-like collection of models backed by compact records.
+
+    Reading an entry returns a fresh model, so changes to it must be written back
+    with `store[id] = model` (DIYBotMCPServer's mutation methods do this).
+    """
+
+    def __init__(self, to_record: Callable[[M], R]):
+        self._to_record = to_record
+        self._records: Dict[str, R] = {}
+
+    def __getitem__(self, key: str) -> M:
+        return self._records[key].to_model()
+
+    def __setitem__(self, key: str, model: M):
+        self._records[key] = self._to_record(model)
+
+    def __delitem__(self, key: str):
+        del self._records[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, key) -> bool:
+        return key in self._records
+
+    def get(self, key: str, default=None):
+        record = self._records.get(key)
+        return record.to_model() if record is not None else default
+
+    def records(self) -> Dict[str, R]:
+        """The raw records, for read-only scans that don't need models"""
+        return self._records
+
+
+def tool_store() -> RecordStore:
+    return RecordStore(ToolRecord.from_model)
+
+
+def house_object_store() -> RecordStore:
+    return RecordStore(HouseObjectRecord.from_model)
+
+
+def project_store() -> RecordStore:
+    return RecordStore(ProjectRecord.from_model)
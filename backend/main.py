@@ -1,12 +1,47 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import StreamingResponse, JSONResponse
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+import asyncio
 import json
-from models import ProjectCreateRequest, Tool, HouseObject, Project
+import os
+from models import ProjectCreateRequest, ReplanRequest, BatchGenerateStepsRequest, Tool, HouseObject, Project, ProjectStep, ProjectStatus
 from mcp_server import mcp_server
 from ollama_client import ollama_client
+from tool_index import tool_index
+from speculative_planner import speculative_planner
+from search_index import search_index
+import bulk_io
+import wire
 
-app = FastAPI(title="DIY Bot API", version="1.0.0")
+# Seconds between warm-up attempts while models fail to load
+WARMUP_RETRY_S = 30
+
+async def warm_up_models():
+    """Preload and pin the configured models in the background, retrying until they load"""
+    while True:
+        result = await asyncio.to_thread(ollama_client.warm_up)
+        print(f"Model warm-up {result['state']} in {result['duration_s']}s: {list(result['loaded'])}")
+        if result["state"] == "done":
+            return
+        await asyncio.sleep(WARMUP_RETRY_S)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serve /health immediately; /ready turns green once warm-up finishes
+    warmup_task = None
+    if os.environ.get("DIYBOT_WARMUP", "1").lower() in ("0", "false", "no"):
+        ollama_client.warmup["state"] = "skipped"
+    else:
+        warmup_task = asyncio.create_task(warm_up_models())
+    ollama_client.pool.start_health_checks()
+    yield
+    if warmup_task:
+        warmup_task.cancel()
+    ollama_client.pool.stop_health_checks()
+
+app = FastAPI(title="DIY Bot API", version="1.0.0", lifespan=lifespan, default_response_class=wire.FastJSONResponse)
 
 # Enable CORS for frontend connection
 app.add_middleware(
@@ -17,24 +52,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/br for responses above wire.COMPRESSION_MIN_SIZE, as negotiated by Accept-Encoding
+app.add_middleware(wire.CompressionMiddleware)
+
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Connections that opted into the compact frame schema
+        self.compact_connections: Set[WebSocket] = set()
+        # Connections that named themselves with /ws?client_id=..., for replies to their HTTP calls
+        self.clients: Dict[str, WebSocket] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        if websocket.query_params.get("frames") == "compact":
+            self.compact_connections.add(websocket)
+        client_id = websocket.query_params.get("client_id")
+        if client_id:
+            self.clients[client_id] = websocket
 
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
+        self.compact_connections.discard(websocket)
+        self.clients = {client_id: ws for client_id, ws in self.clients.items() if ws is not websocket}
+
+    async def send_personal_message(self, frame: dict, websocket: WebSocket):
+        await websocket.send_text(wire.encode_frame(frame, websocket in self.compact_connections))
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    async def send_token(self, content: str, websocket: WebSocket):
+        await websocket.send_text(wire.encode_token_frame(content, websocket in self.compact_connections))
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
+    async def send_to_client(self, client_id: str, frame: dict) -> bool:
+        """Best-effort send to a named connection; returns False if it is gone or the send failed"""
+        websocket = self.clients.get(client_id)
+        if websocket is None:
+            return False
+        try:
+            await self.send_personal_message(frame, websocket)
+            return True
+        except Exception as e:
+            print(f"Could not send {frame.get('type')} to client {client_id}: {e}")
+            return False
 
 manager = ConnectionManager()
 
@@ -44,8 +104,19 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: models are preloaded and an Ollama backend is reachable"""
+    body = {
+        "status": "ready" if ollama_client.is_ready() else "not_ready",
+        "warmup": ollama_client.warmup,
+        "healthy_backends": len(ollama_client.pool.confirmed_healthy())
+    }
+    return JSONResponse(body, status_code=200 if body["status"] == "ready" else 503)
+
 @app.get("/debug/mcp-state")
 async def debug_mcp_state():
     """Debug endpoint to check MCP server state"""
@@ -57,6 +128,18 @@ async def debug_mcp_state():
         "mcp_server_id": id(mcp_server)
     }
 
+@app.get("/debug/ollama-metrics")
+async def debug_ollama_metrics():
+    """Debug endpoint with per-route model assignments, latency and token usage"""
+    return {
+        "routes": {name: route.model_dump() for name, route in ollama_client.routes.items()},
+        "metrics": ollama_client.get_metrics(),
+        "plan_parsing": ollama_client.get_plan_metrics(),
+        "backends": ollama_client.pool.status(),
+        "tool_index": {"size": tool_index.size, "pending": len(tool_index.pending), "version": tool_index.version},
+        "speculative_planning": speculative_planner.status()
+    }
+
 @app.post("/debug/add-test-tool")
 async def add_test_tool():
     """Debug endpoint to manually add a test tool"""
@@ -75,7 +158,7 @@ async def add_test_tool():
     )
     
     print(f"Adding test tool with ID {tool_id} to MCP server {id(mcp_server)}")
-    mcp_server.tools_db[tool_id] = test_tool
+    mcp_server.add_tool(test_tool)
     print(f"Tool added. Total tools: {len(mcp_server.tools_db)}")
     
     return {
@@ -91,17 +174,119 @@ async def get_tools():
     print(f"API tools endpoint called. MCP tools DB has {len(mcp_server.tools_db)} tools")
     print(f"Tools in DB: {list(mcp_server.tools_db.keys())}")
     print(f"Returning {len(tools_list)} tools: {[tool.name for tool in tools_list]}")
-    return [tool.model_dump() for tool in tools_list]
+    return wire.FastJSONResponse(tools_list)
 
 @app.get("/api/house-objects")
 async def get_house_objects():
     """Get all house objects"""
-    return list(mcp_server.house_objects_db.values())
+    return wire.FastJSONResponse(list(mcp_server.house_objects_db.values()))
 
 @app.get("/api/projects")
 async def get_projects():
     """Get all projects"""
-    return list(mcp_server.projects_db.values())
+    return wire.FastJSONResponse(list(mcp_server.projects_db.values()))
+
+@app.get("/api/search")
+async def search(q: str, kind: Optional[str] = None, limit: int = 20):
+    """Ranked prefix search over projects, steps, tools and house objects (kind: comma-separated filter)"""
+    kinds = {k.strip() for k in kind.split(",") if k.strip()} if kind else None
+    return {
+        "query": q,
+        "results": search_index.search(q, kinds=kinds, limit=max(1, min(limit, 100)))
+    }
+
+async def _apply_generated_steps(project_id: str, steps_result: dict) -> List[ProjectStep]:
+    """Turn a plan generation result into the project's steps, with a single fallback step if it is empty"""
+    project = mcp_server.projects_db[project_id]
+    
+    # Create steps in the project
+    steps_data = steps_result.get("steps", [])
+    print(f"Steps data extracted: {steps_data}")
+    project_steps = []
+    
+    if not steps_data:
+        print("No steps data found, trying to create fallback steps")
+        # Create a fallback step if AI didn't generate proper steps
+        fallback_step = ProjectStep(
+            id="step_1",
+            step_number=1,
+            title="Begin Project",
+            description=f"Start working on: {project.description}",
+            required_tools=[],
+            is_active=True,
+            is_completed=False
+        )
+        project_steps.append(fallback_step)
+    else:
+        for i, step_data in enumerate(steps_data):
+            print(f"Creating step {i+1}: {step_data}")
+            step = ProjectStep(
+                id=f"step_{i+1}",
+                step_number=i + 1,
+                title=step_data.get("title", f"Step {i+1}"),
+                description=step_data.get("description", ""),
+                required_tools=step_data.get("required_tools", []),
+                is_active=i == 0,  # First step is active
+                is_completed=False
+            )
+            project_steps.append(step)
+        
+        # Map the model's free-text tool names onto toolroom IDs in one batched lookup;
+        # it calls the embedding model, so it runs off the event loop
+        await asyncio.to_thread(tool_index.link_required_tools, project_steps)
+    
+    # Update project with steps
+    project = mcp_server.set_project_steps(project_id, project_steps, status=ProjectStatus.IN_PROGRESS)
+    
+    print(f"Project updated with {len(project_steps)} steps, status: {project.status}")
+    return project_steps
+
+@app.post("/api/projects/generate-steps:batch")
+async def generate_steps_batch(request: BatchGenerateStepsRequest):
+    """
+    Generate steps for many projects concurrently, streaming one NDJSON line per
+    project as it finishes. Failures are reported per project.
+    """
+    project_ids = list(dict.fromkeys(request.project_ids))
+    
+    # The tool inventory part of the prompt is identical for every project
+    available_tools = mcp_server.tool_summaries()
+    tools_context = ollama_client.build_tools_context(available_tools)
+    
+    async def generate_one(project_id: str) -> dict:
+        try:
+            if project_id not in mcp_server.projects_db:
+                return {"project_id": project_id, "status": "error", "error": "Project not found"}
+            description = mcp_server.projects_db.records()[project_id].description
+            steps_result = await speculative_planner.take(project_id, description)
+            if steps_result is None:
+                async with ollama_client.pool.generation_slots:
+                    steps_result = await asyncio.to_thread(
+                        ollama_client.plan_project_steps, description, available_tools, tools_context
+                    )
+            if "error" in steps_result:
+                return {"project_id": project_id, "status": "error", "error": steps_result["error"]}
+            project_steps = await _apply_generated_steps(project_id, steps_result)
+            return {
+                "project_id": project_id,
+                "steps": project_steps,
+                "status": "steps_generated"
+            }
+        except Exception as e:
+            return {"project_id": project_id, "status": "error", "error": str(e)}
+    
+    async def stream_results():
+        succeeded = failed = 0
+        for finished in asyncio.as_completed([generate_one(project_id) for project_id in project_ids]):
+            result = await finished
+            if result["status"] == "error":
+                failed += 1
+            else:
+                succeeded += 1
+            yield wire.dumps(result) + b"\n"
+        yield wire.dumps({"status": "batch_complete", "succeeded": succeeded, "failed": failed}) + b"\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @app.post("/api/projects/{project_id}/generate-steps")
 async def generate_steps(project_id: str):
@@ -110,73 +295,93 @@ async def generate_steps(project_id: str):
         if project_id not in mcp_server.projects_db:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        project = mcp_server.projects_db[project_id]
+        project = mcp_server.projects_db.records()[project_id]
         
         # Use AI to generate steps based on project description
-        available_tools = list(mcp_server.tools_db.values())
-        print(f"Available tools for step generation: {[tool.name for tool in available_tools]}")
+        available_tools = mcp_server.tool_summaries()
+        print(f"Available tools for step generation: {len(available_tools)}")
         
-        steps_result = await ollama_client.generate_project_steps(
-            project.description, 
-            [tool.model_dump() for tool in available_tools]
-        )
+        # A plan generated in the background during discovery is served if still valid
+        steps_result = await speculative_planner.take(project_id, project.description)
+        if steps_result is None:
+            async with ollama_client.pool.generation_slots:
+                steps_result = await asyncio.to_thread(
+                    ollama_client.plan_project_steps,
+                    project.description, 
+                    available_tools
+                )
         
         print(f"AI step generation result: {steps_result}")
         
         if "error" in steps_result:
             raise HTTPException(status_code=500, detail=steps_result["error"])
         
-        # Create steps in the project
-        steps_data = steps_result.get("steps", [])
-        print(f"Steps data extracted: {steps_data}")
-        project_steps = []
-        
-        from models import ProjectStep
-        
-        if not steps_data:
-            print("No steps data found, trying to create fallback steps")
-            # Create a fallback step if AI didn't generate proper steps
-            fallback_step = ProjectStep(
-                id="step_1",
-                step_number=1,
-                title="Begin Project",
-                description=f"Start working on: {project.description}",
-                required_tools=[],
-                is_active=True,
-                is_completed=False
-            )
-            project_steps.append(fallback_step)
-        else:
-            for i, step_data in enumerate(steps_data):
-                print(f"Creating step {i+1}: {step_data}")
-                step = ProjectStep(
-                    id=f"step_{i+1}",
-                    step_number=i + 1,
-                    title=step_data.get("title", f"Step {i+1}"),
-                    description=step_data.get("description", ""),
-                    required_tools=step_data.get("required_tools", []),
-                    is_active=i == 0,  # First step is active
-                    is_completed=False
-                )
-                project_steps.append(step)
-        
-        # Update project with steps
-        project.steps = project_steps
-        project.total_steps = len(project_steps)
-        project.current_step = 1 if project_steps else None
-        project.status = "in_progress"
-        
-        print(f"Project updated with {len(project_steps)} steps, status: {project.status}")
+        project_steps = await _apply_generated_steps(project_id, steps_result)
         
-        return {
+        return wire.FastJSONResponse({
             "project_id": project_id,
-            "steps": [step.model_dump() for step in project_steps],
+            "steps": project_steps,
             "status": "steps_generated"
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/projects/{project_id}/replan")
+async def replan_steps(project_id: str, request: ReplanRequest = ReplanRequest()):
+    """Regenerate only the steps after the current one, e.g. after a tool broke"""
+    if project_id not in mcp_server.projects_db:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    project = mcp_server.projects_db[project_id]
+    if not project.steps:
+        raise HTTPException(status_code=400, detail="Project has no steps yet, generate them first")
+    
+    # Everything up to and including the current step (and anything already done) is kept
+    position = mcp_server.first_editable_step(project)
+    current_index = project.current_step - 1 if project.current_step else None
+    
+    tool_records = mcp_server.tools_db.records()
+    
+    def step_summary(step):
+        # required_tools holds IDs for owned tools; the model needs names
+        names = [tool_records[t].name if t in tool_records else t for t in step.required_tools]
+        return {"title": step.title, "description": step.description, "required_tools": names}
+    
+    available_tools = mcp_server.tool_summaries()
+    try:
+        async with ollama_client.pool.generation_slots:
+            steps_result = await asyncio.to_thread(
+                ollama_client.plan_remaining_steps,
+                project.description,
+                [step_summary(step) for i, step in enumerate(project.steps[:position]) if i != current_index],
+                step_summary(project.steps[current_index]) if current_index is not None else None,
+                [step_summary(step) for step in project.steps[position:]],
+                available_tools,
+                request.reason or ""
+            )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if "error" in steps_result:
+        raise HTTPException(status_code=500, detail=steps_result["error"])
+    steps_data = steps_result.get("steps", [])
+    if not steps_data:
+        raise HTTPException(status_code=502, detail="AI did not return replacement steps")
+    
+    new_steps = [mcp_server.new_step(step_data) for step_data in steps_data]
+    await asyncio.to_thread(tool_index.link_required_tools, new_steps)
+    mcp_server.splice_project_steps(project_id, position, new_steps)
+    project = mcp_server.projects_db[project_id]
+    print(f"Replanned project {project_id} from step {position + 1}: {len(new_steps)} new steps")
+    
+    return wire.FastJSONResponse({
+        "project_id": project_id,
+        "replaced_from": position + 1,
+        "steps": project.steps,
+        "status": "steps_replanned"
+    })
+
 @app.post("/api/projects")
 async def create_project(request: ProjectCreateRequest):
     """Create a new project"""
@@ -213,7 +418,8 @@ async def create_project(request: ProjectCreateRequest):
         
         # Store the initial AI message in the project
         new_project.initial_ai_message = ai_response
-        mcp_server.projects_db[project_id] = new_project
+        mcp_server.add_project(new_project)
+        speculative_planner.record_turn(project_id)
         
         return {
             "project_id": project_id,
@@ -240,7 +446,7 @@ async def add_tool(tool_data: dict):
             icon_keywords=tool_data.get("icon_keywords", []),
             properties=tool_data.get("properties", {})
         )
-        mcp_server.tools_db[tool_id] = new_tool
+        mcp_server.add_tool(new_tool)
         
         return {
             "tool_id": tool_id,
@@ -250,6 +456,125 @@ async def add_tool(tool_data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _bulk_import(request: Request, build, key, name_index, commit, collection: str, chunk_size: int,
+                       progress_client: Optional[str] = None):
+    """
+    Stream an NDJSON or CSV request body into an inventory collection. Progress
+    frames go only to the caller's own /ws connection, if it names one.
+    """
+    content_type = request.headers.get("content-type", "")
+    lines = bulk_io.iter_lines(request.stream())
+    if "csv" in content_type:
+        rows = bulk_io.iter_csv_rows(lines)
+    else:
+        rows = bulk_io.iter_ndjson_rows(lines)
+
+    async def report_progress(progress: dict):
+        # Committed chunks stay committed: a failed progress send must never abort the import
+        await manager.send_to_client(progress_client, {"type": "import_progress", "collection": collection, **progress})
+
+    return await bulk_io.bulk_import(
+        rows,
+        build=build,
+        key=key,
+        name_index=name_index,
+        commit=commit,
+        chunk_size=max(1, chunk_size),
+        on_progress=report_progress if progress_client else None,
+    )
+
+@app.post("/api/tools:bulk")
+async def bulk_add_tools(request: Request, chunk_size: int = bulk_io.DEFAULT_CHUNK_SIZE, progress_client: Optional[str] = None):
+    """Bulk import tools from a streamed NDJSON or CSV body, skipping names already in the toolroom"""
+    try:
+        return await _bulk_import(
+            request,
+            build=bulk_io.tool_from_row,
+            key=lambda tool: mcp_server.tool_name_key(tool.name),
+            name_index=mcp_server.tool_name_index,
+            commit=mcp_server.add_tool,
+            collection="tools",
+            chunk_size=chunk_size,
+            progress_client=progress_client,
+        )
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body must be UTF-8: {e}")
+
+@app.post("/api/house-objects:bulk")
+async def bulk_add_house_objects(request: Request, chunk_size: int = bulk_io.DEFAULT_CHUNK_SIZE,
+                                 progress_client: Optional[str] = None):
+    """Bulk import house objects from a streamed NDJSON or CSV body, skipping known name/location pairs"""
+    try:
+        return await _bulk_import(
+            request,
+            build=bulk_io.house_object_from_row,
+            key=lambda obj: mcp_server.house_object_name_key(obj.name, obj.location),
+            name_index=mcp_server.house_object_name_index,
+            commit=mcp_server.add_house_object,
+            collection="house_objects",
+            chunk_size=chunk_size,
+            progress_client=progress_client,
+        )
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Body must be UTF-8: {e}")
+
+@app.get("/api/tools:export")
+async def export_tools():
+    """Stream the toolroom inventory as NDJSON"""
+    return StreamingResponse(bulk_io.iter_ndjson_export(mcp_server.tools_db), media_type="application/x-ndjson")
+
+@app.get("/api/house-objects:export")
+async def export_house_objects():
+    """Stream the house objects inventory as NDJSON"""
+    return StreamingResponse(bulk_io.iter_ndjson_export(mcp_server.house_objects_db), media_type="application/x-ndjson")
+
+async def stream_ai_response(websocket: WebSocket, content: str, context: dict, conversation_history: list):
+    """
+    Send a reply as ai_token frames while Ollama decodes it. Tokens that pile up
+    while a frame is being sent are coalesced into the next one.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    def produce() -> bool:
+        try:
+            for piece in ollama_client.stream_chat_with_mcp(content, context=context, mcp_server=mcp_server, conversation_history=conversation_history):
+                loop.call_soon_threadsafe(queue.put_nowait, piece)
+            return True
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, f"Error: {str(e)}")
+            return False
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+    
+    producer = asyncio.create_task(asyncio.to_thread(produce))
+    compact = websocket in manager.compact_connections
+    pieces: List[str] = []
+    done = False
+    while not done:
+        batch = [await queue.get()]
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch[-1] is None:
+            batch.pop()
+            done = True
+        if batch:
+            pieces.extend(batch)
+            await manager.send_token("".join(batch), websocket)
+    
+    # Inventory changes notify listeners that expect the event loop, so they happen here, not in the thread
+    if await producer:
+        announcement = ollama_client.add_mentioned_tools(content, mcp_server)
+        if announcement:
+            pieces.append(announcement)
+            await manager.send_token(announcement, websocket)
+    
+    # Compact clients already have every token; verbose ones get the whole reply as usual
+    if compact:
+        await manager.send_personal_message({"type": "ai_response_end", "timestamp": wire.timestamp_ms()}, websocket)
+    else:
+        await manager.send_personal_message({"type": "ai_response", "content": "".join(pieces), "timestamp": wire.timestamp_ms()}, websocket)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -264,24 +589,28 @@ async def websocket_endpoint(websocket: WebSocket):
             
             print(f"WebSocket using MCP server ID: {id(mcp_server)}, tools count before: {len(mcp_server.tools_db)}")
             
-            ai_response = await ollama_client.chat_with_mcp(
-                message_data.get('content', ''),
-                context=context,
-                mcp_server=mcp_server,
-                conversation_history=conversation_history
-            )
+            if message_data.get('stream'):
+                await stream_ai_response(websocket, message_data.get('content', ''), context, conversation_history)
+            else:
+                ai_response = await ollama_client.chat_with_mcp(
+                    message_data.get('content', ''),
+                    context=context,
+                    mcp_server=mcp_server,
+                    conversation_history=conversation_history
+                )
+                await manager.send_personal_message({
+                    "type": "ai_response",
+                    "content": ai_response,
+                    "timestamp": wire.timestamp_ms()
+                }, websocket)
             
             print(f"Tools count after AI response: {len(mcp_server.tools_db)}")
-            
-            response = {
-                "type": "ai_response",
-                "content": ai_response,
-                "timestamp": json.dumps({"timestamp": "now"})  # TODO: Add proper timestamp
-            }
-            await manager.send_personal_message(json.dumps(response), websocket)
+            if not context.get('step_id'):
+                speculative_planner.record_turn(context.get('project_id'))
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # permessage-deflate is negotiated with clients that offer it (all current browsers)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
\ No newline at end of file
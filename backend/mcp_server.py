@@ -1,33 +1,176 @@
-from mcp.server import Server
-from mcp.types import Tool as MCPTool, TextContent
 import json
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 from models import Tool, HouseObject, Project, ProjectStep, ToolCondition, ProjectStatus
+from compact_store import RecordStore, tool_store, house_object_store, project_store
 import uuid
 from datetime import datetime
 
 class DIYBotMCPServer:
     def __init__(self):
-        self.server = Server("diybot-mcp")
-        self.tools_db: Dict[str, Tool] = {}
-        self.house_objects_db: Dict[str, HouseObject] = {}
-        self.projects_db: Dict[str, Project] = {}
+        # The MCP protocol server (and the heavy mcp package) is only loaded on first use
+        self._server = None
+        # Dict-like stores of compact records; reads return models, writes must be stored back
+        self.tools_db: RecordStore = tool_store()
+        self.house_objects_db: RecordStore = house_object_store()
+        self.projects_db: RecordStore = project_store()
+        
+        # Normalized name -> id, used to dedupe inventory inserts
+        self.tool_name_index: Dict[str, str] = {}
+        self.house_object_name_index: Dict[str, str] = {}
+        
+        # Called with (event, item) after every mutation, e.g. ("tool_added", tool)
+        self._listeners: List[Callable[[str, Any], None]] = []
         
         # Initialize with some default tools
         self._init_default_data()
-        
-        # Register MCP tools
-        self._register_tools()
+    
+    @property
+    def server(self):
+        """MCP protocol server with all tools registered"""
+        if self._server is None:
+            from mcp.server import Server
+            self._server = Server("diybot-mcp")
+            # Register MCP tools
+            self._register_tools()
+        return self._server
     
     def _init_default_data(self):
         """Initialize with empty inventories - tools will be added through conversation"""
         # Start with empty toolroom - tools will be discovered and added through AI conversation
         pass
     
+    @staticmethod
+    def tool_name_key(name: str) -> str:
+        """Normalize a tool name for index lookups"""
+        return " ".join(name.lower().split())
+    
+    @staticmethod
+    def house_object_name_key(name: str, location: str) -> str:
+        """Normalize a house object name/location pair for index lookups"""
+        return " ".join(name.lower().split()) + "@" + " ".join(location.lower().split())
+    
+    def subscribe(self, listener: Callable[[str, Any], None]):
+        """Register a callback that is notified of every inventory/project mutation"""
+        self._listeners.append(listener)
+    
+    def _notify(self, event: str, item: Any):
+        for listener in self._listeners:
+            try:
+                listener(event, item)
+            except Exception as e:
+                print(f"Error in MCP server listener for {event}: {e}")
+    
+    def add_tool(self, tool: Tool) -> Tool:
+        """Insert a tool into the toolroom and keep the name index in sync"""
+        self.tools_db[tool.id] = tool
+        self.tool_name_index[self.tool_name_key(tool.name)] = tool.id
+        self._notify("tool_added", tool)
+        return tool
+    
+    def update_tool(self, tool_id: str, **changes) -> Tool:
+        """Change fields of an existing tool (quantity, condition, ...)"""
+        tool = self.tools_db[tool_id]
+        for field, value in changes.items():
+            setattr(tool, field, value)
+        self.tools_db[tool_id] = tool
+        self._notify("tool_updated", tool)
+        return tool
+    
+    def add_house_object(self, obj: HouseObject) -> HouseObject:
+        """Insert a house object and keep the name index in sync"""
+        self.house_objects_db[obj.id] = obj
+        self.house_object_name_index[self.house_object_name_key(obj.name, obj.location)] = obj.id
+        self._notify("house_object_added", obj)
+        return obj
+    
+    def add_project(self, project: Project) -> Project:
+        """Insert a project"""
+        self.projects_db[project.id] = project
+        self._notify("project_added", project)
+        return project
+    
+    def save_project(self, project: Project) -> Project:
+        """Store back a project read from projects_db after changing its fields"""
+        self.projects_db[project.id] = project
+        return project
+    
+    def set_project_steps(self, project_id: str, steps: List[ProjectStep], status: Optional[ProjectStatus] = None) -> Project:
+        """Replace a project's whole plan"""
+        project = self.projects_db[project_id]
+        project.steps = steps
+        project.total_steps = len(steps)
+        project.current_step = 1 if steps else None
+        if status is not None:
+            project.status = status
+        self.save_project(project)
+        self._notify("project_steps_changed", project)
+        return project
+    
+    @staticmethod
+    def new_step(step_data: Dict) -> ProjectStep:
+        """Build an unnumbered step from a title/description/required_tools dict"""
+        return ProjectStep(
+            id=str(uuid.uuid4()),
+            step_number=0,
+            title=step_data["title"],
+            description=step_data["description"],
+            required_tools=step_data.get("required_tools", [])
+        )
+    
+    def tool_summaries(self) -> List[Dict]:
+        """Name, quantity and condition of every tool for planning prompts, read without building models"""
+        return [
+            {"name": record.name, "quantity": record.quantity, "condition": record.condition}
+            for record in self.tools_db.records().values()
+        ]
+    
+    def get_project_step(self, project_id: str, step_id: str) -> Optional[ProjectStep]:
+        """One step of a project, without materializing the rest of its plan"""
+        record = self.projects_db.records().get(project_id)
+        return record.steps.find(step_id) if record is not None else None
+    
+    @staticmethod
+    def first_editable_step(project: Project) -> int:
+        """Index of the first step after the current one that isn't completed; earlier steps are fixed"""
+        position = project.current_step or 0
+        while position < len(project.steps) and project.steps[position].is_completed:
+            position += 1
+        return position
+    
+    def splice_project_steps(self, project_id: str, position: int, new_steps: List[ProjectStep], replace_count: Optional[int] = None) -> List[ProjectStep]:
+        """
+        Replace `replace_count` steps starting at index `position` (default: all of them)
+        with new steps. The current step and completed steps can't be moved or replaced,
+        so `position` must be at or after first_editable_step(); only the tail is renumbered.
+        The stored step columns are edited in place, so earlier steps are never rebuilt.
+        """
+        record = self.projects_db.records()[project_id]
+        steps = record.steps
+        position = max(0, min(position, len(steps)))
+        first_editable = steps.first_editable(record.current_step)
+        if position < first_editable:
+            raise ValueError(f"Steps can only be inserted from step {first_editable + 1} on; earlier steps are current or completed")
+        end = len(steps) if replace_count is None else min(len(steps), position + replace_count)
+        if any(steps.is_completed(i) for i in range(position, end)):
+            raise ValueError("Completed steps cannot be replaced")
+        
+        for i, step in enumerate(new_steps):
+            step.step_number = position + i + 1
+        steps.splice(position, end, new_steps)
+        
+        record.total_steps = len(steps)
+        if record.current_step is None and len(steps):
+            record.current_step = 1
+            steps.activate(0)
+        if self._listeners:
+            self._notify("project_steps_changed", record.to_model())
+        return new_steps
+    
     def _register_tools(self):
         """Register all MCP tools that AI can call"""
+        from mcp.types import Tool as MCPTool, TextContent
         
-        @self.server.list_tools()
+        @self._server.list_tools()
         async def list_tools() -> List[MCPTool]:
             return [
                 MCPTool(
@@ -137,6 +280,31 @@ class DIYBotMCPServer:
                         "required": ["project_id", "steps"]
                     }
                 ),
+                MCPTool(
+                    name="insert_project_steps",
+                    description="Insert steps into a project at a position (e.g. a 'replace tool' step after the current one), optionally replacing existing uncompleted steps",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "project_id": {"type": "string"},
+                            "position": {"type": "integer", "description": "Step number the first inserted step will get"},
+                            "replace_count": {"type": "integer", "description": "How many existing steps to replace (default 0)"},
+                            "steps": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "title": {"type": "string"},
+                                        "description": {"type": "string"},
+                                        "required_tools": {"type": "array", "items": {"type": "string"}}
+                                    },
+                                    "required": ["title", "description", "required_tools"]
+                                }
+                            }
+                        },
+                        "required": ["project_id", "position", "steps"]
+                    }
+                ),
                 MCPTool(
                     name="get_projects",
                     description="Get all projects",
@@ -147,7 +315,7 @@ class DIYBotMCPServer:
                 ),
             ]
         
-        @self.server.call_tool()
+        @self._server.call_tool()
         async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
             try:
                 if name == "get_toolroom_inventory":
@@ -168,7 +336,7 @@ class DIYBotMCPServer:
                         icon_keywords=arguments.get("icon_keywords"),
                         properties=arguments.get("properties")
                     )
-                    self.tools_db[tool_id] = new_tool
+                    self.add_tool(new_tool)
                     return [TextContent(
                         type="text",
                         text=f"Added tool '{new_tool.name}' to inventory with ID {tool_id}"
@@ -178,10 +346,8 @@ class DIYBotMCPServer:
                     tool_id = arguments["tool_id"]
                     if tool_id in self.tools_db:
                         old_qty = self.tools_db[tool_id].quantity
-                        self.tools_db[tool_id].quantity += arguments["change_amount"]
                         # Ensure quantity doesn't go below 0
-                        if self.tools_db[tool_id].quantity < 0:
-                            self.tools_db[tool_id].quantity = 0
+                        self.update_tool(tool_id, quantity=max(0, old_qty + arguments["change_amount"]))
                         
                         return [TextContent(
                             type="text",
@@ -194,7 +360,7 @@ class DIYBotMCPServer:
                     tool_id = arguments["tool_id"]
                     if tool_id in self.tools_db:
                         old_condition = self.tools_db[tool_id].condition
-                        self.tools_db[tool_id].condition = ToolCondition(arguments["condition"])
+                        self.update_tool(tool_id, condition=ToolCondition(arguments["condition"]))
                         notes = arguments.get("notes", "")
                         
                         return [TextContent(
@@ -213,7 +379,7 @@ class DIYBotMCPServer:
                         type=arguments["type"],
                         properties=arguments.get("properties")
                     )
-                    self.house_objects_db[obj_id] = new_obj
+                    self.add_house_object(new_obj)
                     return [TextContent(
                         type="text",
                         text=f"Added house object '{new_obj.name}' in {new_obj.location} with ID {obj_id}"
@@ -235,7 +401,7 @@ class DIYBotMCPServer:
                         status=ProjectStatus.PLANNING,
                         created_at=datetime.now().isoformat()
                     )
-                    self.projects_db[project_id] = new_project
+                    self.add_project(new_project)
                     return [TextContent(
                         type="text",
                         text=f"Created project '{new_project.title}' with ID {project_id}"
@@ -259,8 +425,12 @@ class DIYBotMCPServer:
                             project.steps.append(step)
                         
                         project.total_steps = len(project.steps)
-                        project.current_step = 1 if project.steps else None
+                        # Appending must not move the user back to step 1
+                        if project.current_step is None and project.steps:
+                            project.current_step = 1
                         project.status = ProjectStatus.IN_PROGRESS
+                        self.save_project(project)
+                        self._notify("project_steps_changed", project)
                         
                         return [TextContent(
                             type="text",
@@ -269,6 +439,22 @@ class DIYBotMCPServer:
                     else:
                         return [TextContent(type="text", text=f"Project with ID {project_id} not found")]
                 
+                elif name == "insert_project_steps":
+                    project_id = arguments["project_id"]
+                    if project_id in self.projects_db:
+                        new_steps = self.splice_project_steps(
+                            project_id,
+                            arguments["position"] - 1,
+                            [self.new_step(step_data) for step_data in arguments["steps"]],
+                            replace_count=arguments.get("replace_count", 0)
+                        )
+                        return [TextContent(
+                            type="text",
+                            text=f"Inserted {len(new_steps)} steps into project '{self.projects_db[project_id].title}' at step {new_steps[0].step_number if new_steps else arguments['position']}"
+                        )]
+                    else:
+                        return [TextContent(type="text", text=f"Project with ID {project_id} not found")]
+                
                 elif name == "get_projects":
                     projects_list = list(self.projects_db.values())
                     return [TextContent(
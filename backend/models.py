@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, create_model
 from typing import Optional, List, Dict
 from enum import Enum
 
@@ -34,10 +34,23 @@ class ProjectStep(BaseModel):
     step_number: int
     title: str
     description: str
-    required_tools: List[str]  # Tool IDs
+    required_tools: List[str]  # Tool IDs (names for tools not in the toolroom)
+    missing_tools: List[str] = []  # Required tool names with no confident inventory match
     is_active: bool = False
     is_completed: bool = False
 
+# Fields of ProjectStep the model fills in during plan generation; the rest are assigned server-side
+GENERATED_STEP_FIELDS = ("title", "description", "required_tools")
+
+GeneratedStep = create_model(
+    "GeneratedStep",
+    **{name: (ProjectStep.model_fields[name].annotation, ...) for name in GENERATED_STEP_FIELDS}
+)
+
+class GeneratedPlan(BaseModel):
+    title: str
+    steps: List[GeneratedStep] = Field(min_length=1)
+
 class Project(BaseModel):
     id: str
     title: str
@@ -53,6 +66,12 @@ class Project(BaseModel):
 class ProjectCreateRequest(BaseModel):
     description: str
 
+class BatchGenerateStepsRequest(BaseModel):
+    project_ids: List[str]
+
+class ReplanRequest(BaseModel):
+    reason: Optional[str] = None
+
 class MCPToolCall(BaseModel):
     function_name: str
     arguments: Dict
@@ -1,21 +1,313 @@
-import requests
+from __future__ import annotations
+import asyncio
 import json
-from typing import Dict, List, Any, Optional
-from models import ChatMessage, MCPToolCall
+import os
+import threading
+import time
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, Iterator, List, Any, Optional, Tuple
+from pydantic import BaseModel
+from pydantic import ValidationError
+from models import ChatMessage, MCPToolCall, ProjectStep, GeneratedPlan, GENERATED_STEP_FIELDS
+from ollama_pool import OllamaPool
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_MODEL = "mistral:instruct"
+FAST_MODEL = "llama3.2:3b"
+EMBEDDING_MODEL = "nomic-embed-text"
+
+class ModelRoute(BaseModel):
+    """Model and generation options used for one type of Ollama call"""
+    model: str
+    num_ctx: Optional[int] = None
+    num_predict: Optional[int] = None
+    temperature: Optional[float] = None
+    # Calls slower than this count against the backend's circuit breaker (None: the pool default)
+    slow_call_s: Optional[float] = None
+
+    def options(self) -> Dict:
+        """Ollama generation options"""
+        return {k: v for k, v in self.model_dump(exclude={"model", "slow_call_s"}).items() if v is not None}
+
+# Only plan generation needs the big model; chat turns are short and latency-sensitive
+DEFAULT_ROUTES: Dict[str, ModelRoute] = {
+    "discovery_chat": ModelRoute(model=FAST_MODEL, num_ctx=4096, num_predict=384, temperature=0.7),
+    "step_chat": ModelRoute(model=FAST_MODEL, num_ctx=4096, num_predict=512, temperature=0.5),
+    "chat": ModelRoute(model=FAST_MODEL, num_ctx=4096, num_predict=512, temperature=0.7),
+    # Long plans on CPU inference legitimately run for minutes: only timeouts count as failures
+    "plan_generation": ModelRoute(model=DEFAULT_MODEL, num_ctx=8192, num_predict=2048, temperature=0.4, slow_call_s=300.0),
+    # Replans only cover the tail of a plan, so they get a smaller output budget
+    "replan": ModelRoute(model=DEFAULT_MODEL, num_ctx=8192, num_predict=1024, temperature=0.4, slow_call_s=300.0),
+    "summarization": ModelRoute(model=FAST_MODEL, num_ctx=8192, num_predict=256, temperature=0.2),
+    "extraction": ModelRoute(model=FAST_MODEL, num_ctx=2048, num_predict=256, temperature=0.0),
+    "embedding": ModelRoute(model=EMBEDDING_MODEL),
+}
+
+# Generation attempts per plan: the first call plus bounded repair retries
+MAX_PLAN_ATTEMPTS = 2
+
+def plan_json_schema() -> Dict:
+    """JSON schema for Ollama's constrained decoding, derived from ProjectStep's generated fields"""
+    step_properties = ProjectStep.model_json_schema()["properties"]
+    step_schema = {
+        "type": "object",
+        "properties": {
+            name: {k: v for k, v in step_properties[name].items() if k != "title"}
+            for name in GENERATED_STEP_FIELDS
+        },
+        "required": list(GENERATED_STEP_FIELDS),
+    }
+    return {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "steps": {"type": "array", "items": step_schema, "minItems": 1},
+        },
+        "required": ["title", "steps"],
+    }
+
+PLAN_SCHEMA = plan_json_schema()
+
+def parse_plan(text: str) -> GeneratedPlan:
+    """
+    Validate a plan response. Constrained output should be pure JSON, but models
+    served without format support may wrap it in prose, so fall back to the outermost braces.
+    """
+    try:
+        return GeneratedPlan.model_validate_json(text)
+    except ValidationError:
+        start_idx = text.find('{')
+        end_idx = text.rfind('}') + 1
+        if start_idx < 0 or end_idx <= start_idx:
+            raise
+        return GeneratedPlan.model_validate_json(text[start_idx:end_idx])
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434"):
+    def __init__(self, base_url: str = "http://localhost:11434", routes: Optional[Dict[str, ModelRoute]] = None, pool: Optional[OllamaPool] = None):
         self.base_url = base_url
-        self.model = "mistral:instruct"
+        # Requests are spread over every backend in OLLAMA_BASE_URLS (or just base_url)
+        self.pool = pool or OllamaPool.from_env(base_url)
+        # Fallback model for unknown routes and for routes whose model isn't pulled
+        self.model = os.environ.get("DIYBOT_DEFAULT_MODEL", DEFAULT_MODEL)
+        self.routes: Dict[str, ModelRoute] = {name: route.model_copy() for name, route in (routes or DEFAULT_ROUTES).items()}
+        # Route models Ollama answered 404 for; skipped until reconfigured
+        self.unavailable_models: set = set()
+        for name in list(self.routes):
+            self._configure_route_from_env(name)
+        self.metrics: Dict[str, Dict] = {}
+        # Sent with every request so preloaded models stay pinned in memory (-1 = never unload)
+        self.keep_alive = os.environ.get("DIYBOT_KEEP_ALIVE", "-1")
+        self.warmup: Dict[str, Any] = {"state": "pending", "loaded": {}, "errors": {}, "duration_s": None}
+        self.plan_metrics: Dict[str, int] = {"plans": 0, "attempts": 0, "parse_failures": 0, "repaired": 0, "fallbacks": 0}
     
-    async def chat_with_mcp(self, message: str, context: Optional[Dict] = None, mcp_server=None, conversation_history: Optional[List[Dict]] = None) -> str:
+    def configure_route(self, name: str, **changes) -> ModelRoute:
+        """Override the model and/or generation options of a route"""
+        route = self.routes.get(name, ModelRoute(model=self.model))
+        self.routes[name] = ModelRoute.model_validate({**route.model_dump(), **changes})
+        self.unavailable_models.discard(self.routes[name].model)
+        return self.routes[name]
+    
+    def _configure_route_from_env(self, name: str):
         """
-        Chat with Ollama with enhanced MCP integration for tool discovery
+        Apply a route's environment overrides, e.g. DIYBOT_PLAN_GENERATION_MODEL=llama3.1:70b
+        and DIYBOT_PLAN_GENERATION_OPTIONS='{"num_ctx": 16384, "temperature": 0.2}'
         """
+        prefix = f"DIYBOT_{name.upper()}"
+        changes = {}
+        if os.environ.get(f"{prefix}_MODEL"):
+            changes["model"] = os.environ[f"{prefix}_MODEL"]
         try:
-            # Enhanced system prompt for project discovery phase
-            if context and context.get("phase") == "discovery":
-                system_prompt = f"""You are DIY Bot in PROJECT DISCOVERY mode. Your job is to thoroughly understand the user's DIY project before generating any steps.
+            changes.update(json.loads(os.environ.get(f"{prefix}_OPTIONS") or "{}"))
+            if changes:
+                self.configure_route(name, **changes)
+        except ValueError as e:
+            # Also catches pydantic's ValidationError; a bad override keeps the route's defaults
+            print(f"Ignoring invalid {prefix}_MODEL/{prefix}_OPTIONS: {e}")
+    
+    def get_route(self, name: str) -> ModelRoute:
+        return self.routes.get(name) or ModelRoute(model=self.model)
+    
+    def _record_metrics(self, route_name: str, model: str, latency_ms: float, result: Optional[Dict]):
+        stats = self.metrics.setdefault(route_name, {
+            "calls": 0, "errors": 0, "total_latency_ms": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "models": {}
+        })
+        stats["calls"] += 1
+        stats["total_latency_ms"] += latency_ms
+        stats["models"][model] = stats["models"].get(model, 0) + 1
+        if result is None:
+            stats["errors"] += 1
+            return
+        stats["prompt_tokens"] += result.get("prompt_eval_count", 0)
+        stats["completion_tokens"] += result.get("eval_count", 0)
+    
+    def get_metrics(self) -> Dict[str, Dict]:
+        """Per-route call counts, latency and token usage"""
+        report = {}
+        for name, stats in self.metrics.items():
+            calls = stats["calls"] or 1
+            report[name] = {
+                **stats,
+                "model": self.get_route(name).model,
+                "avg_latency_ms": round(stats["total_latency_ms"] / calls, 1),
+                "avg_completion_tokens": round(stats["completion_tokens"] / calls, 1),
+            }
+        return report
+    
+    def _keep_alive_value(self):
+        # Ollama takes either a duration string ("10m") or a number of seconds
+        try:
+            return int(self.keep_alive)
+        except ValueError:
+            return self.keep_alive
+    
+    def warm_up(self) -> Dict:
+        """
+        Load and pin every configured model on every healthy backend so the first
+        user request doesn't pay model load time. Blocking; run it off the event loop.
+        """
+        self.warmup["state"] = "running"
+        started = time.perf_counter()
+        self.pool.check_health()
+        
+        def effective_model(route: ModelRoute) -> str:
+            return self.model if route.model in self.unavailable_models else route.model
+        
+        def load(model: str, embedding: bool):
+            # A request without a prompt/input only loads the model
+            if embedding:
+                endpoint, payload = "/api/embed", {"model": model, "input": "", "keep_alive": self._keep_alive_value()}
+            else:
+                endpoint, payload = "/api/generate", {"model": model, "keep_alive": self._keep_alive_value()}
+            loaded_on = []
+            for backend in self.pool.backends:
+                if not backend.healthy:
+                    continue
+                try:
+                    # Loading a model from disk can be slow without the backend being unhealthy
+                    response = self.pool.post_to(backend, endpoint, payload, slow_call_s=float("inf"))
+                except Exception as e:
+                    self.warmup["errors"][f"{model}@{backend.base_url}"] = str(e)
+                    continue
+                if response.status_code == 200:
+                    loaded_on.append(backend.base_url)
+                else:
+                    self.warmup["errors"][f"{model}@{backend.base_url}"] = f"HTTP {response.status_code}"
+                    if response.status_code == 404 and model != self.model:
+                        self.unavailable_models.add(model)
+            if loaded_on:
+                self.warmup["loaded"][model] = loaded_on
+                print(f"Preloaded {model} on {len(loaded_on)} backend(s)")
+        
+        for route_name, route in self.routes.items():
+            model = effective_model(route)
+            if model not in self.warmup["loaded"]:
+                load(model, route_name == "embedding")
+            # If the route's own model turned out to be missing, load its fallback instead
+            if effective_model(route) != model and effective_model(route) not in self.warmup["loaded"]:
+                load(effective_model(route), route_name == "embedding")
+        
+        self.warmup["duration_s"] = round(time.perf_counter() - started, 2)
+        all_loaded = all(effective_model(route) in self.warmup["loaded"] for route in self.routes.values())
+        self.warmup["state"] = "done" if all_loaded else "failed"
+        return self.warmup
+    
+    def is_ready(self) -> bool:
+        """Models are loaded (or warm-up is disabled) and a health probe has reached at least one backend"""
+        return self.warmup["state"] in ("done", "skipped") and bool(self.pool.confirmed_healthy())
+    
+    def get_plan_metrics(self) -> Dict:
+        """Plan generation parse outcomes; failure rate is per generation attempt"""
+        attempts = self.plan_metrics["attempts"] or 1
+        return {**self.plan_metrics, "parse_failure_rate": round(self.plan_metrics["parse_failures"] / attempts, 3)}
+    
+    def _post(self, route_name: str, endpoint: str, payload: Dict) -> requests.Response:
+        """
+        POST to Ollama using the model and options of the given route.
+        Falls back to the default model if the route's model isn't available.
+        """
+        route = self.get_route(route_name)
+        if route.model == self.model or route.model in self.unavailable_models:
+            models_to_try = [self.model]
+        else:
+            models_to_try = [route.model, self.model]
+        for model in models_to_try:
+            body = {**payload, "model": model, "keep_alive": self._keep_alive_value()}
+            options = route.options()
+            if options:
+                body["options"] = {**options, **payload.get("options", {})}
+            
+            started = time.perf_counter()
+            try:
+                response = self.pool.post(endpoint, json=body, slow_call_s=route.slow_call_s)
+            except Exception:
+                self._record_metrics(route_name, model, (time.perf_counter() - started) * 1000, None)
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+            
+            if response.status_code == 404 and model != models_to_try[-1]:
+                print(f"Model {model} not available for route {route_name}, falling back to {self.model}")
+                self.unavailable_models.add(model)
+                self._record_metrics(route_name, model, latency_ms, None)
+                continue
+            self._record_metrics(route_name, model, latency_ms, response.json() if response.status_code == 200 else None)
+            return response
+        return response
+    
+    def _stream(self, route_name: str, endpoint: str, payload: Dict) -> Iterator[Dict]:
+        """
+        Streaming counterpart of _post: yields Ollama's NDJSON chunks as they arrive.
+        The 404 fallback only applies before the first chunk.
+        """
+        import requests
+        route = self.get_route(route_name)
+        if route.model == self.model or route.model in self.unavailable_models:
+            models_to_try = [self.model]
+        else:
+            models_to_try = [route.model, self.model]
+        for model in models_to_try:
+            body = {**payload, "model": model, "keep_alive": self._keep_alive_value()}
+            options = route.options()
+            if options:
+                body["options"] = {**options, **payload.get("options", {})}
+            
+            started = time.perf_counter()
+            final = None
+            try:
+                for line in self.pool.stream(endpoint, json=body, slow_call_s=route.slow_call_s):
+                    chunk = json.loads(line)
+                    if chunk.get("done"):
+                        # The last chunk carries the token counts
+                        final = chunk
+                    yield chunk
+            except requests.HTTPError as e:
+                latency_ms = (time.perf_counter() - started) * 1000
+                self._record_metrics(route_name, model, latency_ms, None)
+                if e.response is not None and e.response.status_code == 404 and model != models_to_try[-1]:
+                    print(f"Model {model} not available for route {route_name}, falling back to {self.model}")
+                    self.unavailable_models.add(model)
+                    continue
+                raise
+            except Exception:
+                self._record_metrics(route_name, model, (time.perf_counter() - started) * 1000, None)
+                raise
+            self._record_metrics(route_name, model, (time.perf_counter() - started) * 1000, final or {})
+            return
+    
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts in a single Ollama call"""
+        response = self._post("embedding", "/api/embed", {"input": texts})
+        if response.status_code != 200:
+            raise RuntimeError(f"Embedding request failed: {response.status_code}")
+        return response.json()["embeddings"]
+    
+    def build_chat_messages(self, message: str, context: Optional[Dict] = None, mcp_server=None, conversation_history: Optional[List[Dict]] = None) -> Tuple[str, List[Dict]]:
+        """Route name and Ollama chat messages for a user turn"""
+        # Enhanced system prompt for project discovery phase
+        if context and context.get("phase") == "discovery":
+            system_prompt = f"""You are DIY Bot in PROJECT DISCOVERY mode. Your job is to thoroughly understand the user's DIY project before generating any steps.
 
 DISCOVERY PHASE GOALS:
 1. Ask specific questions about their project scope and requirements
@@ -34,8 +326,8 @@ Current project: {context.get('project_description', 'No description yet')}
 Project ID: {context.get('project_id', 'Unknown')}
 
 Start by analyzing this project and asking specific tool-related questions. Focus on discovery, not step generation yet!"""
-            elif context and context.get("step_id"):
-                system_prompt = """You are DIY Bot in STEP EXECUTION mode. You're helping the user complete a specific step of their DIY project.
+        elif context and context.get("step_id"):
+            system_prompt = """You are DIY Bot in STEP EXECUTION mode. You're helping the user complete a specific step of their DIY project.
 
 STEP EXECUTION GOALS:
 1. Help the user complete the current step successfully
@@ -51,8 +343,8 @@ IMPORTANT CAPABILITIES:
 - Insert additional steps if complications arise
 
 Be supportive and practical. Focus on helping them succeed with the current step."""
-            else:
-                system_prompt = """You are DIY Bot, an intelligent assistant that helps users plan and execute DIY projects. 
+        else:
+            system_prompt = """You are DIY Bot, an intelligent assistant that helps users plan and execute DIY projects. 
 
 Your capabilities include:
 - Analyzing project requirements and breaking them into steps  
@@ -63,156 +355,202 @@ Your capabilities include:
 
 Always be conversational and helpful. Announce when you're updating inventories or making assumptions about the user's tools/house."""
 
-            # Build conversation context with MCP function awareness
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
+        # Build conversation context with MCP function awareness
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        
+        # Add current toolroom inventory to context
+        if mcp_server:
+            # Read the raw records: only a count and three names are needed
+            tool_records = mcp_server.tools_db.records()
+            first_tools = list(islice(tool_records.values(), 3))
+            tools_summary = f"Current toolroom inventory: {len(tool_records)} tools including: " + ", ".join([f"{tool.name} (qty: {tool.quantity}, condition: {tool.condition})" for tool in first_tools])
+            if len(tool_records) > 3:
+                tools_summary += f" and {len(tool_records) - 3} more tools."
             
-            # Add current toolroom inventory to context
-            if mcp_server:
-                current_tools = list(mcp_server.tools_db.values())
-                tools_summary = f"Current toolroom inventory: {len(current_tools)} tools including: " + ", ".join([f"{tool.name} (qty: {tool.quantity}, condition: {tool.condition})" for tool in current_tools[:3]])
-                if len(current_tools) > 3:
-                    tools_summary += f" and {len(current_tools) - 3} more tools."
-                
+            messages.append({
+                "role": "system", 
+                "content": tools_summary
+            })
+        
+        # Add project context if available
+        if context:
+            if context.get("project_id"):
                 messages.append({
                     "role": "system", 
-                    "content": tools_summary
+                    "content": f"Current project context: {json.dumps(context)}"
                 })
             
-            # Add project context if available
-            if context:
-                if context.get("project_id"):
-                    messages.append({
-                        "role": "system", 
-                        "content": f"Current project context: {json.dumps(context)}"
-                    })
-                
-                # Add specific step context if we're in step execution mode
-                if context.get("step_id") and mcp_server:
-                    # Find the current step and project details
-                    project_id = context.get("project_id")
-                    step_id = context.get("step_id")
-                    if project_id and project_id in mcp_server.projects_db:
-                        project = mcp_server.projects_db[project_id]
-                        current_step = next((step for step in project.steps if step.id == step_id), None)
-                        if current_step:
-                            step_context = f"""
+            # Add specific step context if we're in step execution mode
+            if context.get("step_id") and mcp_server:
+                # Find the current step and project details
+                project_id = context.get("project_id")
+                step_id = context.get("step_id")
+                if project_id and project_id in mcp_server.projects_db:
+                    project = mcp_server.projects_db.records()[project_id]
+                    current_step = mcp_server.get_project_step(project_id, step_id)
+                    if current_step:
+                        # required_tools holds inventory IDs for owned tools; the model needs names
+                        tool_records = mcp_server.tools_db.records()
+                        owned_tools = [tool_records[t].name if t in tool_records else t
+                                       for t in current_step.required_tools if t not in current_step.missing_tools]
+                        step_context = f"""
 CURRENT STEP DETAILS:
 - Step {current_step.step_number}: {current_step.title}
 - Description: {current_step.description}
-- Required Tools: {', '.join(current_step.required_tools)}
+- Required Tools: {', '.join(owned_tools) or 'None'}
+- Tools Not In Toolroom: {', '.join(current_step.missing_tools) or 'None'}
 - Project: {project.title}
 
 The user is currently working on this step. Focus your responses on helping them complete it successfully."""
-                            messages.append({
-                                "role": "system",
-                                "content": step_context
-                            })
+                        messages.append({
+                            "role": "system",
+                            "content": step_context
+                        })
+        
+        # Add conversation history if provided
+        if conversation_history:
+            for hist_msg in conversation_history:
+                role = "assistant" if hist_msg["type"] == "ai" else "user"
+                messages.append({"role": role, "content": hist_msg["content"]})
+        
+        messages.append({"role": "user", "content": message})
+        
+        # Pick the model route by conversation phase
+        if context and context.get("phase") == "discovery":
+            route_name = "discovery_chat"
+        elif context and context.get("step_id"):
+            route_name = "step_chat"
+        else:
+            route_name = "chat"
+        return route_name, messages
+    
+    @staticmethod
+    def add_mentioned_tools(message: str, mcp_server) -> str:
+        """
+        Add tools the user says they own to the inventory.
+        Returns the announcement to append to the AI's reply, or "" if nothing was added.
+        """
+        # Parse user message for explicit tool ownership statements
+        has_tool_phrases = ["i have a", "i have", "i've got", "i own", "i got", "yes i have", "yes, i have", "yes i do have", "i do have"]
+        if mcp_server and any(phrase in message.lower() for phrase in has_tool_phrases):
             
-            # Add conversation history if provided
-            if conversation_history:
-                for hist_msg in conversation_history:
-                    role = "assistant" if hist_msg["type"] == "ai" else "user"
-                    messages.append({"role": role, "content": hist_msg["content"]})
+            # Extract tool mentions and add them to inventory
+            tool_mappings = {
+                "drill": {"name": "Power Drill", "category": "Power Tools"},
+                "hammer": {"name": "Hammer", "category": "Hand Tools"},
+                "wrench": {"name": "Wrench Set", "category": "Hand Tools"},
+                "screwdriver": {"name": "Screwdriver Set", "category": "Hand Tools"},
+                "saw": {"name": "Hand Saw", "category": "Hand Tools"},
+                "pliers": {"name": "Pliers", "category": "Hand Tools"},
+                "level": {"name": "Level", "category": "Measuring Tools"},
+                "tape measure": {"name": "Tape Measure", "category": "Measuring Tools"},
+                "plunger": {"name": "Plunger", "category": "Plumbing Tools"},
+                "socket": {"name": "Socket Set", "category": "Hand Tools"},
+                "ratchet": {"name": "Ratchet", "category": "Hand Tools"}
+            }
             
-            messages.append({"role": "user", "content": message})
+            added_tools = []
+            existing_names = [record.name.lower() for record in mcp_server.tools_db.records().values()]
             
-            # Make request to Ollama
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": messages,
-                    "stream": False
-                }
-            )
+            # Find which ownership phrase was used and look for tools after it
+            message_lower = message.lower()
+            ownership_phrase_found = None
+            phrase_position = -1
+            
+            for phrase in has_tool_phrases:
+                pos = message_lower.find(phrase)
+                if pos >= 0:
+                    ownership_phrase_found = phrase
+                    phrase_position = pos + len(phrase)
+                    break
+            
+            if ownership_phrase_found and phrase_position >= 0:
+                # Look for tools mentioned after the ownership phrase
+                text_after_phrase = message_lower[phrase_position:]
+                
+                for keyword, tool_info in tool_mappings.items():
+                    if keyword in text_after_phrase:
+                        # Check if tool already exists
+                        if not any(tool_info["name"].lower() in name for name in existing_names):
+                            # Add the tool via MCP
+                            try:
+                                import uuid
+                                from models import Tool, ToolCondition
+                                
+                                tool_id = str(uuid.uuid4())
+                                new_tool = Tool(
+                                    id=tool_id,
+                                    name=tool_info["name"],
+                                    category=tool_info["category"],
+                                    quantity=1,
+                                    condition=ToolCondition.WORKING,
+                                    icon_keywords=[keyword],
+                                    properties={}
+                                )
+                                mcp_server.add_tool(new_tool)
+                                existing_names.append(new_tool.name.lower())
+                                added_tools.append(tool_info["name"])
+                                print(f"Added tool {tool_info['name']} with ID {tool_id}. Total tools in DB: {len(mcp_server.tools_db)}")
+                            except Exception as e:
+                                print(f"Error adding tool {tool_info['name']}: {e}")
+            
+            if added_tools:
+                return f"\n\n✅ I've added these tools to your toolroom inventory: {', '.join(added_tools)}. I can now track them for your project!"
+        
+        return ""
+    
+    async def chat_with_mcp(self, message: str, context: Optional[Dict] = None, mcp_server=None, conversation_history: Optional[List[Dict]] = None) -> str:
+        """
+        Chat with Ollama with enhanced MCP integration for tool discovery.
+        The Ollama call (including pool failover) runs in a worker thread; mentioned
+        tools are added back on the event loop.
+        """
+        try:
+            route_name, messages = self.build_chat_messages(message, context, mcp_server, conversation_history)
+            response = await asyncio.to_thread(self._post, route_name, "/api/chat", {
+                "messages": messages,
+                "stream": False
+            })
             
             if response.status_code == 200:
                 result = response.json()
                 ai_response = result["message"]["content"]
                 
                 # Enhanced response with tool inventory awareness and MCP function calling
-                enhanced_response = ai_response
-                
-                # Parse user message for explicit tool ownership statements
-                has_tool_phrases = ["i have a", "i have", "i've got", "i own", "i got", "yes i have", "yes, i have", "yes i do have", "i do have"]
-                if mcp_server and any(phrase in message.lower() for phrase in has_tool_phrases):
-                    
-                    # Extract tool mentions and add them to inventory
-                    tool_mappings = {
-                        "drill": {"name": "Power Drill", "category": "Power Tools"},
-                        "hammer": {"name": "Hammer", "category": "Hand Tools"},
-                        "wrench": {"name": "Wrench Set", "category": "Hand Tools"},
-                        "screwdriver": {"name": "Screwdriver Set", "category": "Hand Tools"},
-                        "saw": {"name": "Hand Saw", "category": "Hand Tools"},
-                        "pliers": {"name": "Pliers", "category": "Hand Tools"},
-                        "level": {"name": "Level", "category": "Measuring Tools"},
-                        "tape measure": {"name": "Tape Measure", "category": "Measuring Tools"},
-                        "plunger": {"name": "Plunger", "category": "Plumbing Tools"},
-                        "socket": {"name": "Socket Set", "category": "Hand Tools"},
-                        "ratchet": {"name": "Ratchet", "category": "Hand Tools"}
-                    }
-                    
-                    added_tools = []
-                    
-                    # Find which ownership phrase was used and look for tools after it
-                    message_lower = message.lower()
-                    ownership_phrase_found = None
-                    phrase_position = -1
-                    
-                    for phrase in has_tool_phrases:
-                        pos = message_lower.find(phrase)
-                        if pos >= 0:
-                            ownership_phrase_found = phrase
-                            phrase_position = pos + len(phrase)
-                            break
-                    
-                    if ownership_phrase_found and phrase_position >= 0:
-                        # Look for tools mentioned after the ownership phrase
-                        text_after_phrase = message_lower[phrase_position:]
-                        
-                        for keyword, tool_info in tool_mappings.items():
-                            if keyword in text_after_phrase:
-                                # Check if tool already exists
-                                existing_tools = list(mcp_server.tools_db.values())
-                                if not any(tool_info["name"].lower() in tool.name.lower() for tool in existing_tools):
-                                    # Add the tool via MCP
-                                    try:
-                                        import uuid
-                                        from models import Tool, ToolCondition
-                                        
-                                        tool_id = str(uuid.uuid4())
-                                        new_tool = Tool(
-                                            id=tool_id,
-                                            name=tool_info["name"],
-                                            category=tool_info["category"],
-                                            quantity=1,
-                                            condition=ToolCondition.WORKING,
-                                            icon_keywords=[keyword],
-                                            properties={}
-                                        )
-                                        mcp_server.tools_db[tool_id] = new_tool
-                                        added_tools.append(tool_info["name"])
-                                        print(f"Added tool {tool_info['name']} with ID {tool_id}. Total tools in DB: {len(mcp_server.tools_db)}")
-                                    except Exception as e:
-                                        print(f"Error adding tool {tool_info['name']}: {e}")
-                    
-                    if added_tools:
-                        enhanced_response += f"\n\n✅ I've added these tools to your toolroom inventory: {', '.join(added_tools)}. I can now track them for your project!"
-                
-                return enhanced_response
+                return ai_response + self.add_mentioned_tools(message, mcp_server)
             else:
                 return f"Error communicating with AI: {response.status_code}"
                 
         except Exception as e:
             return f"Error: {str(e)}"
     
-    async def generate_project_steps(self, project_description: str, available_tools: List[Dict]) -> Dict:
+    def stream_chat_with_mcp(self, message: str, context: Optional[Dict] = None, mcp_server=None, conversation_history: Optional[List[Dict]] = None) -> Iterator[str]:
         """
-        Generate project steps based on description and available tools
+        Blocking, token-streaming variant of chat_with_mcp: yields the reply as Ollama
+        decodes it and raises on errors. It only reads the inventory, so it can run in a
+        worker thread; the caller applies add_mentioned_tools on the event loop afterwards.
+        """
+        route_name, messages = self.build_chat_messages(message, context, mcp_server, conversation_history)
+        for chunk in self._stream(route_name, "/api/chat", {"messages": messages, "stream": True}):
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
+    
+    @staticmethod
+    def build_tools_context(available_tools: List[Dict]) -> str:
+        """Tool-inventory portion of the planning prompt; build once when planning many projects"""
+        return "\n".join([f"- {tool['name']} ({tool['quantity']}x, {tool['condition']})" for tool in available_tools])
+    
+    def plan_project_steps(self, project_description: str, available_tools: List[Dict], tools_context: Optional[str] = None,
+                           cancel: Optional[threading.Event] = None) -> Dict:
         """
-        tools_info = "\n".join([f"- {tool['name']} ({tool['quantity']}x, {tool['condition']})" for tool in available_tools])
+        Generate project steps based on description and available tools.
+        Blocking: run it in a worker thread.
+        Setting `cancel` stops the generation early (see _generate_plan).
+        """
+        tools_info = tools_context if tools_context is not None else self.build_tools_context(available_tools)
         
         prompt = f"""
         Based on this project: "{project_description}"
@@ -267,42 +605,116 @@ The user is currently working on this step. Focus your responses on helping them
         Generate AT LEAST 3 steps. Use exact tool NAMES from the available tools list.
         """
         
+        return self._generate_plan("plan_generation", prompt, cancel)
+    
+    def plan_remaining_steps(self, project_description: str, completed_steps: List[Dict], current_step: Optional[Dict],
+                             remaining_steps: List[Dict], available_tools: List[Dict], reason: str = "") -> Dict:
+        """
+        Regenerate only the steps after the current one, e.g. after a tool broke.
+        The prompt carries just enough of the existing plan to continue it.
+        """
+        tools_info = self.build_tools_context(available_tools)
+        done_info = "\n".join([f"- {step['title']}" for step in completed_steps]) or "- (none)"
+        current_info = f"{current_step['title']}: {current_step['description']}" if current_step else "(none)"
+        remaining_info = "\n".join([f"- {step['title']} (tools: {', '.join(step['required_tools']) or 'none'})" for step in remaining_steps]) or "- (none)"
+        
+        prompt = f"""
+        Project: "{project_description}"
+        
+        Already completed steps (do NOT repeat them):
+        {done_info}
+        
+        Current step (keep it, do NOT repeat it):
+        {current_info}
+        
+        The remaining steps were planned as:
+        {remaining_info}
+        
+        What changed: {reason or "the toolroom inventory changed"}
+        
+        Current toolroom inventory:
+        {tools_info}
+        
+        Rewrite ONLY the steps that come after the current step so the project can be finished with the
+        current inventory. If a needed tool is broken or missing, start with a step to repair or replace it.
+        Keep unaffected steps as they were. Use exact tool NAMES from the inventory in required_tools.
+        
+        Format as JSON: {{"title": "Project Title", "steps": [{{"title": "...", "description": "...", "required_tools": ["..."]}}]}}
+        """
+        return self._generate_plan("replan", prompt)
+    
+    def _generate_cancellable(self, route_name: str, payload: Dict, cancel: threading.Event) -> Optional[str]:
+        """
+        Streamed /api/generate that stops as soon as `cancel` is set. Closing the
+        connection makes Ollama abort the decode. Returns None if cancelled.
+        """
+        parts = []
+        stream = self._stream(route_name, "/api/generate", {**payload, "stream": True})
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    return None
+                parts.append(chunk.get("response", ""))
+        finally:
+            stream.close()
+        return "".join(parts)
+    
+    def _generate_plan(self, route_name: str, prompt: str, cancel: Optional[threading.Event] = None) -> Dict:
+        """
+        Run a schema-constrained plan generation with bounded repair retries.
+        With a `cancel` event the response is streamed so it can be abandoned mid-decode.
+        """
+        self.plan_metrics["plans"] += 1
+        ai_response = ""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
+            for attempt in range(MAX_PLAN_ATTEMPTS):
+                payload = {
                     "prompt": prompt,
-                    "stream": False
+                    "format": PLAN_SCHEMA,
+                    "stream": False,
+                    # Retries decode more conservatively
+                    **({"options": {"temperature": 0.0}} if attempt else {})
                 }
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result["response"]
+                if cancel is not None:
+                    ai_response = None if cancel.is_set() else self._generate_cancellable(route_name, payload, cancel)
+                    if ai_response is None:
+                        print("Plan generation cancelled")
+                        return {"error": "Plan generation cancelled"}
+                else:
+                    response = self._post(route_name, "/api/generate", payload)
+                    
+                    if response.status_code != 200:
+                        print(f"AI request failed with status: {response.status_code}")
+                        return {"error": f"AI request failed: {response.status_code}"}
+                    ai_response = response.json()["response"]
+                
+                self.plan_metrics["attempts"] += 1
                 print(f"Raw AI response for step generation: {ai_response}")
                 
-                # Try to parse JSON from response
                 try:
-                    # Extract JSON from response (AI might include extra text)
-                    start_idx = ai_response.find('{')
-                    end_idx = ai_response.rfind('}') + 1
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = ai_response[start_idx:end_idx]
-                        parsed_result = json.loads(json_str)
-                        print(f"Successfully parsed JSON: {parsed_result}")
-                        return parsed_result
-                    else:
-                        print("No valid JSON found in AI response")
-                except Exception as e:
-                    print(f"JSON parsing error: {e}")
-                
-                # Fallback: return raw response
-                print("Using fallback response format")
-                return {"title": "Generated Project", "raw_response": ai_response, "steps": []}
+                    plan = parse_plan(ai_response)
+                    if attempt:
+                        self.plan_metrics["repaired"] += 1
+                    print(f"Successfully parsed plan with {len(plan.steps)} steps")
+                    return plan.model_dump()
+                except ValidationError as e:
+                    self.plan_metrics["parse_failures"] += 1
+                    print(f"Plan validation error (attempt {attempt + 1}/{MAX_PLAN_ATTEMPTS}): {e}")
+                    # Feed the validation errors back so the retry can repair them
+                    prompt = f"""{prompt}
+        
+        Your previous answer was not valid for the required JSON structure:
+        {ai_response[:2000]}
+        
+        Errors:
+        {e}
+        
+        Reply again with ONLY the corrected JSON object."""
             
-            print(f"AI request failed with status: {response.status_code}")
-            return {"error": f"AI request failed: {response.status_code}"}
+            # Fallback: return raw response
+            print("Using fallback response format")
+            self.plan_metrics["fallbacks"] += 1
+            return {"title": "Generated Project", "raw_response": ai_response, "steps": []}
             
         except Exception as e:
             return {"error": str(e)}
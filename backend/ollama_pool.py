@@ -0,0 +1,266 @@
+from __future__ import annotations
+import asyncio
+import itertools
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class OllamaBackend:
+    """One Ollama endpoint with its health, load and circuit breaker state"""
+
+    def __init__(self, base_url: str, failure_threshold: int = 3, cooldown_s: float = 30.0, slow_call_s: float = 120.0):
+        self.base_url = base_url.rstrip("/")
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.slow_call_s = slow_call_s
+
+        # Optimistic for routing, but readiness waits for the first successful probe
+        self.healthy = True
+        self.probed = False
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.circuit = CLOSED
+        self.opened_at = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.ewma_latency_s: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Whether this backend may take a request right now"""
+        with self._lock:
+            if not self.healthy:
+                return False
+            if self.circuit == OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown_s:
+                    return False
+                # Cooldown elapsed: let a single trial request through
+                self.circuit = HALF_OPEN
+                return self.in_flight == 0
+            if self.circuit == HALF_OPEN:
+                return self.in_flight == 0
+            return True
+
+    def acquire(self):
+        with self._lock:
+            self.in_flight += 1
+            self.total_requests += 1
+
+    def release(self, latency_s: float, ok: bool, slow_call_s: Optional[float] = None):
+        """Record a finished call; `slow_call_s` overrides the backend's threshold for long generations"""
+        with self._lock:
+            self.in_flight -= 1
+            self.ewma_latency_s = latency_s if self.ewma_latency_s is None else 0.8 * self.ewma_latency_s + 0.2 * latency_s
+            # A call that succeeded but took far too long still counts against the backend
+            if ok and latency_s <= (self.slow_call_s if slow_call_s is None else slow_call_s):
+                self.consecutive_failures = 0
+                self.circuit = CLOSED
+                return
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            if self.circuit == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.circuit != OPEN:
+                    print(f"Opening circuit for Ollama backend {self.base_url} after {self.consecutive_failures} failures")
+                self.circuit = OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self) -> Dict:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "probed": self.probed,
+            "circuit": self.circuit,
+            "in_flight": self.in_flight,
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "ewma_latency_ms": round(self.ewma_latency_s * 1000, 1) if self.ewma_latency_s is not None else None,
+        }
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+class OllamaPool:
+    """
+    Least-outstanding-requests load balancer over several Ollama endpoints,
+    with background health checks and per-backend circuit breakers.
+    """
+
+    def __init__(self, base_urls: List[str], health_path: str = "/api/version", health_interval_s: float = 10.0,
+                 health_timeout_s: float = 2.0, request_timeout_s: Optional[float] = 300.0,
+                 slots_per_backend: Optional[int] = None, **backend_options):
+        if not base_urls:
+            raise ValueError("OllamaPool needs at least one base URL")
+        self.backends = [OllamaBackend(url, **backend_options) for url in base_urls]
+        # Requests each Ollama server decodes in parallel (its OLLAMA_NUM_PARALLEL setting)
+        self.slots_per_backend = slots_per_backend or int(os.environ.get("OLLAMA_NUM_PARALLEL", "2"))
+        self.health_path = health_path
+        self.health_interval_s = health_interval_s
+        self.health_timeout_s = health_timeout_s
+        self.request_timeout_s = request_timeout_s
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # Shared tie-breaking counter; next() on it is atomic, so worker threads can pick concurrently
+        self._rr = itertools.count()
+        self._generation_slots: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def from_env(cls, default_url: str) -> "OllamaPool":
+        """Build a pool from OLLAMA_BASE_URLS (comma-separated), falling back to a single default URL"""
+        urls = [url.strip() for url in os.environ.get("OLLAMA_BASE_URLS", "").split(",") if url.strip()]
+        return cls(urls or [default_url])
+
+    @property
+    def capacity(self) -> int:
+        """How many generations the pool can usefully run at once"""
+        return self.slots_per_backend * len(self.backends)
+
+    @property
+    def generation_slots(self) -> asyncio.Semaphore:
+        """
+        App-wide limit on concurrent generations, shared by every endpoint so
+        parallel requests together never queue more than `capacity` on Ollama.
+        Created on first use, inside the running event loop.
+        """
+        if self._generation_slots is None:
+            self._generation_slots = asyncio.Semaphore(self.capacity)
+        return self._generation_slots
+
+    def check_health(self):
+        """Probe every backend once with a cheap request"""
+        import requests
+        for backend in self.backends:
+            try:
+                ok = requests.get(f"{backend.base_url}{self.health_path}", timeout=self.health_timeout_s).status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok != backend.healthy:
+                print(f"Ollama backend {backend.base_url} is now {'healthy' if ok else 'unhealthy'}")
+            backend.healthy = ok
+            backend.probed = True
+
+    def confirmed_healthy(self) -> List[OllamaBackend]:
+        """Backends a health probe has actually reached, as opposed to not yet checked"""
+        return [backend for backend in self.backends if backend.probed and backend.healthy]
+
+    def start_health_checks(self):
+        """Start the background health-check loop if it isn't already running"""
+        if self._health_thread and self._health_thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                self.check_health()
+                self._stop.wait(self.health_interval_s)
+
+        self._health_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self):
+        self._stop.set()
+
+    def pick(self, exclude: Optional[set] = None) -> OllamaBackend:
+        """Pick the available backend with the fewest in-flight requests"""
+        candidates = [b for b in self.backends if b not in (exclude or set()) and b.available()]
+        if not candidates:
+            raise NoBackendAvailable("No healthy Ollama backend available")
+        fewest = min(b.in_flight for b in candidates)
+        tied = [b for b in candidates if b.in_flight == fewest]
+        # Rotate among equally loaded backends so idle ones share the work
+        return tied[next(self._rr) % len(tied)]
+
+    def post(self, path: str, json: Dict, idempotent: bool = True, slow_call_s: Optional[float] = None) -> requests.Response:
+        """
+        POST to the least-loaded backend. Idempotent calls are retried on a
+        different backend after a connection error or 5xx response.
+        """
+        # Imported here so the HTTP stack stays off the app's import path
+        import requests
+        self.start_health_checks()
+        tried: set = set()
+        attempts = len(self.backends) if idempotent else 1
+        last_error: Optional[Exception] = None
+        response: Optional[requests.Response] = None
+
+        for _ in range(attempts):
+            try:
+                backend = self.pick(exclude=tried)
+            except NoBackendAvailable:
+                break
+            tried.add(backend)
+            backend.acquire()
+            started = time.monotonic()
+            try:
+                response = requests.post(f"{backend.base_url}{path}", json=json, timeout=self.request_timeout_s)
+            except requests.RequestException as e:
+                backend.release(time.monotonic() - started, ok=False, slow_call_s=slow_call_s)
+                print(f"Ollama backend {backend.base_url} failed: {e}")
+                last_error = e
+                continue
+            ok = response.status_code < 500
+            backend.release(time.monotonic() - started, ok=ok, slow_call_s=slow_call_s)
+            if ok:
+                return response
+            print(f"Ollama backend {backend.base_url} returned {response.status_code}")
+
+        if response is not None:
+            return response
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailable("No healthy Ollama backend available")
+
+    def stream(self, path: str, json: Dict, slow_call_s: Optional[float] = None) -> Iterator[bytes]:
+        """
+        POST a streaming request to the least-loaded backend and yield its response
+        lines. The backend counts as busy until the stream is exhausted or closed;
+        a non-200 answer raises requests.HTTPError before anything is yielded.
+        """
+        import requests
+        self.start_health_checks()
+        backend = self.pick()
+        backend.acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            with requests.post(f"{backend.base_url}{path}", json=json, timeout=self.request_timeout_s, stream=True) as response:
+                ok = response.status_code < 500
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        yield line
+        except requests.RequestException as e:
+            ok = ok and isinstance(e, requests.HTTPError)
+            print(f"Ollama backend {backend.base_url} stream failed: {e}")
+            raise
+        finally:
+            backend.release(time.monotonic() - started, ok=ok, slow_call_s=slow_call_s)
+
+    def post_to(self, backend: OllamaBackend, path: str, json: Dict, timeout: Optional[float] = None,
+                slow_call_s: Optional[float] = None) -> requests.Response:
+        """POST to one specific backend (e.g. to load a model on every server), with load accounting"""
+        import requests
+        backend.acquire()
+        started = time.monotonic()
+        try:
+            response = requests.post(f"{backend.base_url}{path}", json=json, timeout=timeout or self.request_timeout_s)
+        except requests.RequestException:
+            backend.release(time.monotonic() - started, ok=False, slow_call_s=slow_call_s)
+            raise
+        backend.release(time.monotonic() - started, ok=response.status_code < 500, slow_call_s=slow_call_s)
+        return response
+
+    def status(self) -> List[Dict]:
+        return [backend.status() for backend in self.backends]
@@ -0,0 +1,193 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+from models import Tool, HouseObject, Project
+from mcp_server import mcp_server
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "on", "for", "with", "or", "is", "it", "your", "you"}
+
+# Field weights: names/titles rank above keywords, which rank above free text
+TITLE_WEIGHT = 3.0
+KEYWORD_WEIGHT = 2.0
+TEXT_WEIGHT = 1.0
+# A prefix hit counts for less than an exact term hit
+PREFIX_FACTOR = 0.6
+# Upper bound on vocabulary terms a single prefix may expand to
+MAX_PREFIX_EXPANSION = 256
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchIndex:
+    """
+    Inverted index over projects, steps, tools and house objects.
+
+    Each document is keyed by (kind, id); steps use "<project_id>/<step_id>" as their id.
+    Postings map term -> {doc_key: field weight}, and a sorted vocabulary supports
+    prefix lookups by bisection. Documents are re-indexed individually on mutation.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[Tuple[str, str], float]] = {}
+        self.vocabulary: List[str] = []
+        self.doc_terms: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self.doc_info: Dict[Tuple[str, str], Dict] = {}
+        self.project_steps: Dict[str, Set[Tuple[str, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    # Indexing
+
+    def _index(self, doc_key: Tuple[str, str], fields: List[Tuple[Optional[str], float]], info: Dict):
+        self._remove(doc_key)
+        terms: Dict[str, float] = {}
+        for text, weight in fields:
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0.0), weight)
+        for term, weight in terms.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                insort(self.vocabulary, term)
+            docs[doc_key] = weight
+        self.doc_terms[doc_key] = terms
+        self.doc_info[doc_key] = info
+
+    def _remove(self, doc_key: Tuple[str, str]):
+        terms = self.doc_terms.pop(doc_key, None)
+        self.doc_info.pop(doc_key, None)
+        if not terms:
+            return
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(doc_key, None)
+            if not docs:
+                del self.postings[term]
+                del self.vocabulary[bisect_left(self.vocabulary, term)]
+
+    def index_tool(self, tool: Tool):
+        self._index(("tool", tool.id), [
+            (tool.name, TITLE_WEIGHT),
+            (" ".join(tool.icon_keywords or []), KEYWORD_WEIGHT),
+            (tool.category, KEYWORD_WEIGHT),
+            (tool.condition.value if hasattr(tool.condition, "value") else str(tool.condition), TEXT_WEIGHT),
+        ], {"kind": "tool", "id": tool.id, "title": tool.name})
+
+    def index_house_object(self, obj: HouseObject):
+        self._index(("house_object", obj.id), [
+            (obj.name, TITLE_WEIGHT),
+            (obj.location, KEYWORD_WEIGHT),
+            (obj.type, KEYWORD_WEIGHT),
+        ], {"kind": "house_object", "id": obj.id, "title": obj.name, "location": obj.location})
+
+    def index_project(self, project: Project):
+        self._index(("project", project.id), [
+            (project.title, TITLE_WEIGHT),
+            (project.description, TEXT_WEIGHT),
+        ], {"kind": "project", "id": project.id, "title": project.title})
+        self.index_project_steps(project)
+
+    def index_project_steps(self, project: Project):
+        """Re-index one project's steps, dropping steps that no longer exist"""
+        current = set()
+        for step in project.steps:
+            doc_key = ("step", f"{project.id}/{step.id}")
+            current.add(doc_key)
+            self._index(doc_key, [
+                (step.title, TITLE_WEIGHT),
+                (step.description, TEXT_WEIGHT),
+            ], {"kind": "step", "id": step.id, "project_id": project.id, "title": step.title, "step_number": step.step_number})
+        for doc_key in self.project_steps.get(project.id, set()) - current:
+            self._remove(doc_key)
+        self.project_steps[project.id] = current
+
+    def on_mcp_event(self, event: str, item):
+        """MCP server listener: re-index just the mutated document"""
+        if event in ("tool_added", "tool_updated"):
+            self.index_tool(item)
+        elif event == "tool_removed":
+            self._remove(("tool", item.id))
+        elif event == "house_object_added":
+            self.index_house_object(item)
+        elif event == "project_added":
+            self.index_project(item)
+        elif event == "project_steps_changed":
+            self.index_project_steps(item)
+
+    # Querying
+
+    def _expand(self, token: str) -> List[str]:
+        """Vocabulary terms starting with token, exact match first"""
+        start = bisect_left(self.vocabulary, token)
+        matches = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(token):
+                break
+            matches.append(term)
+        return matches
+
+    def search(self, query: str, kinds: Optional[Set[str]] = None, limit: int = 20) -> List[Dict]:
+        """
+        Ranked prefix search. Every query token must match a term of the document,
+        either exactly or as a prefix; scores sum field weight times IDF per token.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        total_docs = max(1, len(self.doc_terms))
+        scores: Optional[Dict[Tuple[str, str], float]] = None
+
+        # Most selective tokens first so the candidate set shrinks quickly
+        expansions = sorted(((token, self._expand(token)) for token in tokens),
+                            key=lambda entry: sum(len(self.postings[t]) for t in entry[1]))
+        for token, terms in expansions:
+            token_scores: Dict[Tuple[str, str], float] = {}
+            for term in terms:
+                docs = self.postings[term]
+                idf = math.log(1 + total_docs / len(docs))
+                factor = 1.0 if term == token else PREFIX_FACTOR
+                # Walk whichever side is smaller: the posting list or the surviving candidates
+                if scores is None:
+                    candidates = docs.items()
+                elif len(docs) <= len(scores):
+                    candidates = ((doc_key, weight) for doc_key, weight in docs.items() if doc_key in scores)
+                else:
+                    candidates = ((doc_key, docs[doc_key]) for doc_key in scores if doc_key in docs)
+                for doc_key, weight in candidates:
+                    if kinds and doc_key[0] not in kinds:
+                        continue
+                    score = weight * idf * factor
+                    if score > token_scores.get(doc_key, 0.0):
+                        token_scores[doc_key] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_key: scores[doc_key] + score for doc_key, score in token_scores.items()}
+            if not scores:
+                return []
+
+        ranked = heapq.nlargest(limit, scores.items(), key=lambda entry: entry[1])
+        return [{**self.doc_info[doc_key], "score": round(score, 3)} for doc_key, score in ranked]
+
+    def rebuild(self):
+        """Index everything currently in the MCP server (used once at startup)"""
+        for tool in list(mcp_server.tools_db.values()):
+            self.index_tool(tool)
+        for obj in list(mcp_server.house_objects_db.values()):
+            self.index_house_object(obj)
+        for project in list(mcp_server.projects_db.values()):
+            self.index_project(project)
+
+
+# Global search index, updated incrementally from MCP server mutations
+search_index = SearchIndex()
+search_index.rebuild()
+mcp_server.subscribe(search_index.on_mcp_event)
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import threading
+from typing import Dict, Optional
+from models import ProjectStatus
+from mcp_server import mcp_server
+from ollama_client import ollama_client
+
+
+class SpeculativePlan:
+    """Background plan generation for one project, tied to the inventory version it was started against"""
+
+    def __init__(self, description: str, inventory_version: int, task: asyncio.Task, cancel: threading.Event):
+        self.description = description
+        self.inventory_version = inventory_version
+        self.task = task
+        # Tells the worker thread to abandon the Ollama call; cancelling the task alone can't stop it
+        self.cancel = cancel
+
+    def stop(self):
+        self.cancel.set()
+        if not self.task.done():
+            self.task.cancel()
+
+
+class SpeculativePlanner:
+    """
+    Optionally starts plan generation in the background once a project's discovery
+    chat has gone `stable_turns` turns without the toolroom changing, so
+    generate_steps can return the plan without waiting on the model.
+    """
+
+    def __init__(self, enabled: bool = False, stable_turns: int = 2, idle_poll_s: float = 0.5):
+        self.enabled = enabled
+        self.stable_turns = stable_turns
+        self.idle_poll_s = idle_poll_s
+        self.inventory_version = 0
+        self.turns_since_change: Dict[str, int] = {}
+        self.last_seen_version: Dict[str, int] = {}
+        self.plans: Dict[str, SpeculativePlan] = {}
+        # Only one speculative generation talks to Ollama at a time
+        self._slot: Optional[asyncio.Semaphore] = None
+        self.stats = {"started": 0, "served": 0, "invalidated": 0, "failed": 0}
+
+    def on_inventory_event(self, event: str, item):
+        """MCP server listener: any toolroom change makes speculative plans stale"""
+        if not event.startswith("tool_"):
+            return
+        self.inventory_version += 1
+        for project_id in list(self.plans):
+            self._discard(project_id)
+            self.stats["invalidated"] += 1
+
+    def _discard(self, project_id: str):
+        plan = self.plans.pop(project_id, None)
+        if plan:
+            plan.stop()
+
+    def record_turn(self, project_id: Optional[str]):
+        """Count a discovery turn and start speculating once the inventory looks settled"""
+        if not self.enabled or not project_id or project_id not in mcp_server.projects_db:
+            return
+        project = mcp_server.projects_db.records()[project_id]
+        if project.status != ProjectStatus.PLANNING:
+            return
+        # A turn during which the toolroom changed restarts the count
+        if self.last_seen_version.get(project_id, self.inventory_version) != self.inventory_version:
+            turns = 0
+        else:
+            turns = self.turns_since_change.get(project_id, 0) + 1
+        self.turns_since_change[project_id] = turns
+        self.last_seen_version[project_id] = self.inventory_version
+        if turns >= self.stable_turns and project_id not in self.plans:
+            self._start(project_id, project.description)
+
+    def _start(self, project_id: str, description: str):
+        print(f"Starting speculative plan generation for project {project_id}")
+        self.stats["started"] += 1
+        cancel = threading.Event()
+        task = asyncio.create_task(self._generate(description, self.inventory_version, cancel))
+        self.plans[project_id] = SpeculativePlan(description, self.inventory_version, task, cancel)
+
+    async def _generate(self, description: str, inventory_version: int, cancel: threading.Event) -> Dict:
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+        async with self._slot:
+            # Low priority: yield to foreground requests already waiting on Ollama
+            while any(backend.in_flight for backend in ollama_client.pool.backends):
+                await asyncio.sleep(self.idle_poll_s)
+            if inventory_version != self.inventory_version:
+                raise asyncio.CancelledError()
+            tools = mcp_server.tool_summaries()
+            async with ollama_client.pool.generation_slots:
+                worker = asyncio.ensure_future(asyncio.to_thread(ollama_client.plan_project_steps, description, tools, None, cancel))
+                try:
+                    return await asyncio.shield(worker)
+                except asyncio.CancelledError:
+                    # Keep the slots until the thread has actually let go of Ollama
+                    cancel.set()
+                    await asyncio.gather(worker, return_exceptions=True)
+                    raise
+
+    async def take(self, project_id: str, description: str) -> Optional[Dict]:
+        """
+        Return the speculative plan for a project if it is still valid, waiting for it
+        if it is already running. Returns None if the caller should generate normally.
+        """
+        plan = self.plans.pop(project_id, None)
+        self.turns_since_change.pop(project_id, None)
+        self.last_seen_version.pop(project_id, None)
+        if plan is None:
+            return None
+        if plan.inventory_version != self.inventory_version or plan.description != description:
+            plan.stop()
+            return None
+        try:
+            result = await plan.task
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            print(f"Speculative plan generation failed: {e}")
+            self.stats["failed"] += 1
+            return None
+        # The inventory may have changed while we were waiting
+        if plan.inventory_version != self.inventory_version or "error" in result:
+            return None
+        self.stats["served"] += 1
+        print(f"Serving speculative plan for project {project_id}")
+        return result
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "stable_turns": self.stable_turns,
+            "inventory_version": self.inventory_version,
+            "pending": {project_id: ("done" if plan.task.done() else "running") for project_id, plan in self.plans.items()},
+            **self.stats,
+        }
+
+
+# Global speculative planner, off unless DIYBOT_SPECULATIVE_PLANNING=1
+speculative_planner = SpeculativePlanner(
+    enabled=os.environ.get("DIYBOT_SPECULATIVE_PLANNING", "0").lower() in ("1", "true", "yes"),
+    stable_turns=int(os.environ.get("DIYBOT_SPECULATIVE_STABLE_TURNS", "2")),
+)
+mcp_server.subscribe(speculative_planner.on_inventory_event)
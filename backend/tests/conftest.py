@@ -0,0 +1,61 @@
+import os
+import sys
+
+# The backend is a flat set of modules run from its own directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from models import Tool, Project, ProjectStep, ProjectStatus, ToolCondition
+
+
+# Model builders shared by the test modules (import them with `from conftest import ...`)
+
+def make_tool(tool_id="t1", name="Hammer", category="Hand Tools", quantity=1, condition=ToolCondition.WORKING,
+              icon_keywords=None, properties=None) -> Tool:
+    return Tool(id=tool_id, name=name, category=category, quantity=quantity, condition=condition,
+                icon_keywords=icon_keywords or [], properties=properties or {})
+
+
+def make_step(number, title=None, description="", required_tools=None, **fields) -> ProjectStep:
+    return ProjectStep(id=f"s{number}", step_number=number, title=title or f"Step {number}", description=description,
+                       required_tools=required_tools or [], **fields)
+
+
+def make_project(project_id="p", step_count=5, current_step=1, completed=0, steps=None, title="P", description="d",
+                 **fields) -> Project:
+    """A project with `step_count` generic steps (the first `completed` done), or the given steps"""
+    if steps is None:
+        steps = [make_step(i + 1, is_active=i + 1 == current_step, is_completed=i < completed) for i in range(step_count)]
+    return Project(id=project_id, title=title, description=description, status=ProjectStatus.IN_PROGRESS,
+                   created_at="2026-01-01T00:00:00", current_step=current_step, total_steps=len(steps), steps=list(steps),
+                   **fields)
+
+
+def make_pool(servers, **options):
+    """OllamaPool over fake servers; tests drive health checks explicitly"""
+    from ollama_pool import OllamaPool
+    pool = OllamaPool([server.url for server in servers], **options)
+    pool.start_health_checks = lambda: None
+    return pool
+
+
+def new_steps(*titles):
+    """Freshly generated steps, as the planner's output would produce them"""
+    from mcp_server import DIYBotMCPServer
+    return [DIYBotMCPServer.new_step({"title": title, "description": "", "required_tools": []}) for title in titles]
+
+
+@pytest.fixture
+def fake_ollama_servers():
+    """Start fake Ollama servers on demand: fake_ollama_servers(2) -> [FakeOllama, FakeOllama]"""
+    from fake_ollama import FakeOllama
+    started = []
+
+    def start(count=1):
+        servers = [FakeOllama() for _ in range(count)]
+        started.extend(servers)
+        return servers
+
+    yield start
+    for server in started:
+        server.close()
@@ -0,0 +1,60 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllama:
+    """
+    Minimal Ollama HTTP server for pool and client tests. Set `status` to make
+    every POST fail, `missing_models` to answer 404 for those models, and queue
+    texts in `generate_responses` to script /api/generate answers.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        self.missing_models = set()
+        self.generate_responses = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send(200, {"version": "fake"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                fake.requests.append((self.path, body))
+                if fake.status != 200:
+                    return self._send(fake.status, {"error": "failing"})
+                if body.get("model") in fake.missing_models:
+                    return self._send(404, {"error": "model not found"})
+                if self.path == "/api/generate" and fake.generate_responses:
+                    return self._send(200, {"response": fake.generate_responses.pop(0), "done": True, "eval_count": 3})
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                    for word in ("one ", "two"):
+                        self.wfile.write((json.dumps({"message": {"content": word}, "done": False}) + "\n").encode())
+                    self.wfile.write((json.dumps({"message": {"content": ""}, "done": True, "eval_count": 2}) + "\n").encode())
+                    return
+                self._send(200, {"message": {"content": f"hi from {body.get('model')}"}, "eval_count": 3})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
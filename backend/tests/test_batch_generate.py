@@ -0,0 +1,45 @@
+import json
+import time
+from fastapi.testclient import TestClient
+from main import app, mcp_server, ollama_client
+from conftest import make_project
+
+
+def test_batch_streams_results_as_projects_finish(monkeypatch):
+    contexts, built = [], []
+    build_tools_context = ollama_client.build_tools_context
+
+    def counting_build(available_tools):
+        built.append(len(available_tools))
+        return build_tools_context(available_tools)
+
+    def plan_project_steps(description, available_tools, tools_context=None, cancel=None):
+        contexts.append(tools_context)
+        if description == "boom":
+            raise RuntimeError("ollama down")
+        if description == "slow":
+            time.sleep(0.3)
+        return {"title": description, "steps": [{"title": f"{description} step", "description": "", "required_tools": []}]}
+
+    monkeypatch.setattr(ollama_client, "build_tools_context", counting_build)
+    monkeypatch.setattr(ollama_client, "plan_project_steps", plan_project_steps)
+    for name in ("slow", "fast", "boom"):
+        mcp_server.add_project(make_project(f"batch-{name}", description=name))
+
+    response = TestClient(app).post("/api/projects/generate-steps:batch",
+                                    json={"project_ids": ["batch-slow", "batch-fast", "batch-missing", "batch-boom", "batch-fast"]})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    by_project = {line.get("project_id"): line for line in lines[:-1]}
+    assert len(lines) == 5 and set(by_project) == {"batch-slow", "batch-fast", "batch-missing", "batch-boom"}
+    # The slow project finishes, and is streamed, last
+    assert lines[-2]["project_id"] == "batch-slow"
+    assert by_project["batch-missing"] == {"project_id": "batch-missing", "status": "error", "error": "Project not found"}
+    assert by_project["batch-boom"] == {"project_id": "batch-boom", "status": "error", "error": "ollama down"}
+    assert by_project["batch-fast"]["status"] == "steps_generated"
+    assert [step["title"] for step in by_project["batch-fast"]["steps"]] == ["fast step"]
+    assert lines[-1] == {"status": "batch_complete", "succeeded": 2, "failed": 2}
+
+    assert len(built) == 1 and len(contexts) == 3 and len(set(contexts)) == 1
+    assert mcp_server.projects_db["batch-slow"].steps[0].title == "slow step"
@@ -0,0 +1,125 @@
+import asyncio
+import uuid
+from fastapi.testclient import TestClient
+import bulk_io
+from main import app, manager
+
+
+async def aiter(items):
+    for item in items:
+        yield item
+
+
+def collect(rows):
+    async def run():
+        return [row async for row in rows]
+    return asyncio.run(run())
+
+
+def test_iter_lines_splits_across_chunks():
+    chunks = [b"a,b\r\n1,", b"2\n", "\xe2\x82".encode("latin-1"), "\xac\n3,4".encode("latin-1")]
+    assert collect(bulk_io.iter_lines(aiter(chunks))) == ["a,b", "1,2", "€", "3,4"]
+
+
+def test_csv_quoted_fields_may_span_lines():
+    lines = ["name,notes", 'Saw,"cuts wood', 'and ""plastic"""', "", "Drill,plain", "Bad"]
+    rows = collect(bulk_io.iter_csv_rows(aiter(lines)))
+    assert rows == [
+        (2, {"name": "Saw", "notes": 'cuts wood\nand "plastic"'}, None),
+        (5, {"name": "Drill", "notes": "plain"}, None),
+        (6, None, "Expected 2 columns, got 1"),
+    ]
+
+
+def test_csv_unterminated_quote_is_reported():
+    rows = collect(bulk_io.iter_csv_rows(aiter(["name", '"Saw', "still open"])))
+    assert rows == [(2, None, "Unterminated quoted field")]
+
+
+def test_csv_quotes_inside_unquoted_fields_are_literal():
+    lines = ["name,category,quantity", '6" Clamp,Hand Tools,2', "Saw,Power Tools,1", '"Bit, 1/4""",Drill Bits,3']
+    rows = collect(bulk_io.iter_csv_rows(aiter(lines)))
+    assert rows == [
+        (2, {"name": '6" Clamp', "category": "Hand Tools", "quantity": "2"}, None),
+        (3, {"name": "Saw", "category": "Power Tools", "quantity": "1"}, None),
+        (4, {"name": 'Bit, 1/4"', "category": "Drill Bits", "quantity": "3"}, None),
+    ]
+
+
+def test_byte_order_mark_is_stripped_from_the_header():
+    body = [b"\xef\xbb\xbfname,quantity\r\nSaw,0\r\n"]
+    rows = collect(bulk_io.iter_csv_rows(bulk_io.iter_lines(aiter(body))))
+    assert rows == [(2, {"name": "Saw", "quantity": "0"}, None)]
+
+
+def test_explicit_zero_quantity_is_kept():
+    assert bulk_io.tool_from_row({"name": "Saw", "quantity": 0}).quantity == 0
+    assert bulk_io.tool_from_row({"name": "Saw", "quantity": ""}).quantity == 1
+    assert bulk_io.tool_from_row({"name": "Saw"}).quantity == 1
+
+
+def test_ndjson_rows_report_bad_lines():
+    rows = collect(bulk_io.iter_ndjson_rows(aiter(['{"name": "Saw"}', "", "[1]", "{oops"])))
+    assert rows[0] == (1, {"name": "Saw"}, None)
+    assert rows[1] == (3, None, "Expected a JSON object")
+    assert rows[2][0] == 4 and rows[2][2].startswith("Invalid JSON")
+
+
+def test_bulk_import_dedupes_and_reports_progress():
+    committed, progress = [], []
+
+    async def on_progress(update):
+        progress.append(update)
+
+    rows = aiter([
+        (1, {"name": "Saw"}, None),
+        (2, {"name": "saw"}, None),
+        (3, {"name": "Hammer", "quantity": "many"}, None),
+        (4, {"name": "Drill", "colour": "red"}, None),
+        (5, {"name": "Level"}, None),
+    ])
+    summary = asyncio.run(bulk_io.bulk_import(
+        rows, build=bulk_io.tool_from_row, key=lambda tool: tool.name.lower(), name_index={"level": "x"},
+        commit=committed.append, chunk_size=2, on_progress=on_progress,
+    ))
+    assert [tool.name for tool in committed] == ["Saw", "Drill"]
+    assert committed[1].properties == {"colour": "red"}
+    assert (summary["added"], summary["skipped"], summary["failed"], summary["chunks"]) == (2, 2, 1, 3)
+    assert summary["errors"][0]["line"] == 3
+    assert [update["processed"] for update in progress] == [2, 4, 5]
+
+
+def test_import_progress_goes_only_to_the_caller(monkeypatch):
+    sent = []
+    send = manager.send_personal_message
+
+    async def recording_send(frame, websocket):
+        sent.append((frame["type"], websocket))
+        await send(frame, websocket)
+
+    monkeypatch.setattr(manager, "send_personal_message", recording_send)
+    name = f"Bulk {uuid.uuid4()}"
+    client = TestClient(app)
+    with client.websocket_connect("/ws?client_id=importer") as caller, client.websocket_connect("/ws"):
+        importer = manager.clients["importer"]
+        response = client.post("/api/tools:bulk?progress_client=importer", content=f'{{"name": "{name}"}}\n',
+                               headers={"content-type": "application/x-ndjson"})
+        assert response.json()["added"] == 1
+        assert caller.receive_json()["type"] == "import_progress"
+    assert sent == [("import_progress", importer)]
+    assert "importer" not in manager.clients
+
+
+def test_failed_progress_send_does_not_fail_the_import():
+    class BrokenSocket:
+        async def send_text(self, text):
+            raise RuntimeError("socket closed")
+
+    name = f"Bulk {uuid.uuid4()}"
+    manager.clients["broken"] = BrokenSocket()
+    try:
+        response = TestClient(app).post("/api/tools:bulk?progress_client=broken", content=f"name\n{name}\n",
+                                        headers={"content-type": "text/csv"})
+    finally:
+        manager.clients.pop("broken")
+    assert response.status_code == 200 and response.json()["added"] == 1
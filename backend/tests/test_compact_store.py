@@ -0,0 +1,62 @@
+from models import HouseObject, ToolCondition
+from compact_store import tool_store, house_object_store, project_store
+from mcp_server import DIYBotMCPServer
+from conftest import make_tool, make_step, make_project
+
+
+def worn_hammer():
+    return make_tool(quantity=2, condition=ToolCondition.NEEDS_MAINTENANCE, icon_keywords=["hammer", "nail"],
+                     properties={"weight": "16oz"})
+
+
+def shelf_project():
+    steps = [
+        make_step(1, "Measure", "Mark the wall", ["t1"], is_completed=True),
+        make_step(2, "Drill", "Drill holes", ["t1", "Drill"], missing_tools=["Drill"], is_active=True),
+        make_step(3, "Hang", "Hang the shelf"),
+    ]
+    return make_project("p1", current_step=2, steps=steps, title="Shelf", description="Hang a shelf", initial_ai_message="Hi")
+
+
+def test_tool_round_trip():
+    store = tool_store()
+    store["t1"] = worn_hammer()
+    assert store["t1"] == worn_hammer()
+    assert store.get("missing") is None
+    assert list(store) == ["t1"] and len(store) == 1 and "t1" in store
+
+
+def test_house_object_round_trip():
+    store = house_object_store()
+    obj = HouseObject(id="h1", name="Sink", location="Kitchen", type="fixture", properties=None)
+    store["h1"] = obj
+    assert store["h1"] == obj
+
+
+def test_project_round_trip_keeps_missing_tools_and_flags():
+    store = project_store()
+    store["p1"] = shelf_project()
+    project = store["p1"]
+    assert project == shelf_project()
+    assert [(s.is_active, s.is_completed) for s in project.steps] == [(False, True), (True, False), (False, False)]
+    assert project.steps[1].missing_tools == ["Drill"]
+
+
+def test_reads_are_copies_until_written_back():
+    store = project_store()
+    store["p1"] = shelf_project()
+    project = store["p1"]
+    project.steps[0].title = "Changed"
+    assert store["p1"].steps[0].title == "Measure"
+    store["p1"] = project
+    assert store["p1"].steps[0].title == "Changed"
+
+
+def test_find_step_and_tool_summaries():
+    server = DIYBotMCPServer()
+    server.add_project(shelf_project())
+    server.add_tool(worn_hammer())
+    assert server.get_project_step("p1", "s2").missing_tools == ["Drill"]
+    assert server.get_project_step("p1", "nope") is None
+    assert server.get_project_step("nope", "s2") is None
+    assert server.tool_summaries() == [{"name": "Hammer", "quantity": 2, "condition": ToolCondition.NEEDS_MAINTENANCE}]
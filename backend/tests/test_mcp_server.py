@@ -0,0 +1,68 @@
+import pytest
+from mcp_server import DIYBotMCPServer
+from conftest import make_project, new_steps
+
+
+@pytest.fixture
+def server():
+    return DIYBotMCPServer()
+
+
+def test_insert_after_current_renumbers_tail(server):
+    server.add_project(make_project(current_step=2, completed=1))
+    server.splice_project_steps("p", 2, new_steps("Replace drill"), replace_count=0)
+    project = server.projects_db["p"]
+    assert [s.id for s in project.steps][:3] == ["s1", "s2", project.steps[2].id]
+    assert project.steps[2].title == "Replace drill"
+    assert [s.step_number for s in project.steps] == [1, 2, 3, 4, 5, 6]
+    assert project.total_steps == 6 and project.current_step == 2
+
+
+def test_replace_tail(server):
+    server.add_project(make_project(current_step=1))
+    server.splice_project_steps("p", 1, new_steps("A", "B"))
+    project = server.projects_db["p"]
+    assert [s.title for s in project.steps] == ["Step 1", "A", "B"]
+    assert project.total_steps == 3
+
+
+def test_cannot_insert_before_current_or_completed_steps(server):
+    server.add_project(make_project(current_step=3, completed=2))
+    for position in (0, 1, 2):
+        with pytest.raises(ValueError):
+            server.splice_project_steps("p", position, new_steps("X"), replace_count=0)
+    project = server.projects_db["p"]
+    assert project.current_step == 3 and [s.id for s in project.steps] == ["s1", "s2", "s3", "s4", "s5"]
+
+
+def test_first_editable_step_skips_completed_steps_after_current(server):
+    project = make_project(current_step=2, completed=4)
+    assert server.first_editable_step(project) == 4
+    server.add_project(project)
+    with pytest.raises(ValueError):
+        server.splice_project_steps("p", 3, new_steps("X"), replace_count=1)
+    server.splice_project_steps("p", 4, new_steps("X"), replace_count=1)
+    assert [s.title for s in server.projects_db["p"].steps] == ["Step 1", "Step 2", "Step 3", "Step 4", "X"]
+
+
+def test_mutations_notify_listeners(server):
+    events = []
+    server.subscribe(lambda event, item: events.append(event))
+    server.add_project(make_project())
+    server.splice_project_steps("p", 1, new_steps("A"))
+    assert events == ["project_added", "project_steps_changed"]
+
+
+def test_splice_edits_the_stored_columns_in_place(server, monkeypatch):
+    server.add_project(make_project(step_count=1000, current_step=998, completed=997))
+    columns = server.projects_db.records()["p"].steps
+    ids = columns.ids
+    built = []
+    monkeypatch.setattr(type(columns), "to_model", lambda self, i: built.append(i))
+
+    server.splice_project_steps("p", 998, new_steps("A", "B", "C"), replace_count=1)
+    assert built == []
+    assert columns.ids is ids and len(columns) == 1002
+    assert list(columns.numbers[995:]) == list(range(996, 1003))
+    assert columns.titles[997:1002] == ["Step 998", "A", "B", "C", "Step 1000"]
+    assert server.projects_db.records()["p"].total_steps == 1002
@@ -0,0 +1,142 @@
+import pytest
+from pydantic import ValidationError
+from mcp_server import DIYBotMCPServer
+from ollama_client import OllamaClient, ModelRoute, ollama_client, parse_plan, plan_json_schema, PLAN_SCHEMA, MAX_PLAN_ATTEMPTS
+from conftest import make_tool, make_step, make_project, make_pool
+
+
+def test_step_context_names_tools_instead_of_ids():
+    server = DIYBotMCPServer()
+    server.add_tool(make_tool("3f2a-uuid", "Power Drill"))
+    step = make_step(1, "Drill holes", required_tools=["3f2a-uuid", "Stud finder"], missing_tools=["Stud finder"])
+    server.add_project(make_project("p1", steps=[step]))
+
+    route, messages = ollama_client.build_chat_messages("next?", {"project_id": "p1", "step_id": "s1"}, server)
+    step_context = messages[-2]["content"]
+    assert route == "step_chat"
+    assert "- Required Tools: Power Drill\n" in step_context
+    assert "- Tools Not In Toolroom: Stud finder\n" in step_context
+    assert "3f2a-uuid" not in step_context
+
+
+PLAN = '{"title": "Shelf", "steps": [{"title": "Drill", "description": "Drill holes", "required_tools": ["Power Drill"]}]}'
+
+
+def plan_client(server):
+    return OllamaClient(pool=make_pool([server]), routes={"plan_generation": ModelRoute(model="big", temperature=0.4)})
+
+
+def test_plan_json_schema_follows_generated_step_fields():
+    schema = plan_json_schema()
+    step = schema["properties"]["steps"]["items"]
+    assert schema["required"] == ["title", "steps"] and schema["properties"]["steps"]["minItems"] == 1
+    assert step["required"] == ["title", "description", "required_tools"]
+    assert step["properties"]["required_tools"] == {"type": "array", "items": {"type": "string"}}
+
+
+def test_parse_plan_accepts_json_wrapped_in_prose():
+    assert parse_plan(PLAN).steps[0].required_tools == ["Power Drill"]
+    assert parse_plan(f"Sure! Here is the plan:\n{PLAN}\nGood luck.").title == "Shelf"
+    with pytest.raises(ValidationError):
+        parse_plan('{"title": "Shelf", "steps": []}')
+    with pytest.raises(ValidationError):
+        parse_plan("no json here")
+
+
+def test_valid_plan_needs_one_constrained_attempt(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.generate_responses = [PLAN]
+    client = plan_client(server)
+    result = client.plan_project_steps("Hang a shelf", [])
+    assert result["steps"][0]["title"] == "Drill"
+    path, body = server.requests[-1]
+    assert path == "/api/generate" and body["format"] == PLAN_SCHEMA
+    assert body["options"] == {"temperature": 0.4}
+    assert client.get_plan_metrics() == {"plans": 1, "attempts": 1, "parse_failures": 0, "repaired": 0, "fallbacks": 0,
+                                         "parse_failure_rate": 0.0}
+
+
+def test_plan_in_prose_is_parsed_without_a_retry(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.generate_responses = [f"Here you go: {PLAN}"]
+    client = plan_client(server)
+    assert client.plan_project_steps("Hang a shelf", [])["title"] == "Shelf"
+    assert len(server.requests) == 1 and client.plan_metrics["parse_failures"] == 0
+
+
+def test_invalid_plan_is_repaired_at_temperature_zero(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.generate_responses = ['{"title": "Shelf", "steps": [{"title": "Drill"}]}', PLAN]
+    client = plan_client(server)
+    result = client.plan_project_steps("Hang a shelf", [])
+    assert result["steps"][0]["required_tools"] == ["Power Drill"]
+
+    (_, first), (_, retry) = server.requests
+    assert retry["options"] == {"temperature": 0.0}
+    assert retry["prompt"].startswith(first["prompt"])
+    assert '{"title": "Drill"}' in retry["prompt"] and "Errors:" in retry["prompt"] and "description" in retry["prompt"]
+    metrics = client.get_plan_metrics()
+    assert (metrics["attempts"], metrics["parse_failures"], metrics["repaired"], metrics["fallbacks"]) == (2, 1, 1, 0)
+    assert metrics["parse_failure_rate"] == 0.5
+
+
+def test_invalid_twice_falls_back_to_the_raw_response(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.generate_responses = ["not a plan", "still not a plan"]
+    client = plan_client(server)
+    result = client.plan_project_steps("Hang a shelf", [])
+    assert result == {"title": "Generated Project", "raw_response": "still not a plan", "steps": []}
+    assert len(server.requests) == MAX_PLAN_ATTEMPTS
+    metrics = client.get_plan_metrics()
+    assert (metrics["plans"], metrics["attempts"], metrics["parse_failures"], metrics["fallbacks"]) == (1, 2, 2, 1)
+    assert metrics["parse_failure_rate"] == 1.0
+
+
+def test_routes_can_be_configured_from_the_environment(monkeypatch, fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    monkeypatch.setenv("DIYBOT_CHAT_MODEL", "tiny")
+    monkeypatch.setenv("DIYBOT_CHAT_OPTIONS", '{"num_ctx": 2048, "temperature": 0.1}')
+    monkeypatch.setenv("DIYBOT_PLAN_GENERATION_OPTIONS", '{"num_ctx": "lots"}')
+    client = OllamaClient(pool=make_pool([server]), routes={"chat": ModelRoute(model="small", num_predict=8),
+                                                            "plan_generation": ModelRoute(model="big", num_ctx=8192)})
+    assert client.get_route("chat") == ModelRoute(model="tiny", num_ctx=2048, num_predict=8, temperature=0.1)
+    # An invalid override keeps the defaults
+    assert client.get_route("plan_generation") == ModelRoute(model="big", num_ctx=8192)
+
+
+def test_chat_turn_does_not_block_the_event_loop(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    callers = []
+
+    class SlowResponse:
+        status_code = 200
+
+        def json(self):
+            return {"message": {"content": "Sounds good."}}
+
+    def slow_post(route_name, endpoint, payload):
+        callers.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.2)
+        return SlowResponse()
+
+    monkeypatch.setattr(ollama_client, "_post", slow_post)
+
+    async def turn_and_ticks():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        reply = await ollama_client.chat_with_mcp("hello", {}, DIYBotMCPServer())
+        ticker.cancel()
+        return reply, ticks
+
+    reply, ticks = asyncio.run(turn_and_ticks())
+    assert reply == "Sounds good." and callers == [False]
+    assert ticks >= 5
@@ -0,0 +1,141 @@
+import asyncio
+import random
+import sys
+import threading
+import pytest
+import requests
+from ollama_pool import OllamaBackend, OllamaPool, NoBackendAvailable, OPEN, CLOSED
+from ollama_client import OllamaClient, ModelRoute
+from conftest import make_pool
+
+
+def test_pick_spreads_ties_and_prefers_idle_backends():
+    pool = OllamaPool(["http://a", "http://b", "http://c"])
+    picked = {pool.pick().base_url for _ in range(6)}
+    assert picked == {"http://a", "http://b", "http://c"}
+    pool.backends[0].acquire()
+    pool.backends[1].acquire()
+    assert all(pool.pick().base_url == "http://c" for _ in range(3))
+
+
+def test_concurrent_picks_with_different_candidate_sets():
+    # Switch threads as often as possible to provoke interleavings inside pick()
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    pool = OllamaPool([f"http://b{i}" for i in range(5)])
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            exclude = set(rng.sample(pool.backends, rng.randint(0, 4)))
+            try:
+                assert pool.pick(exclude=exclude) not in exclude
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sys.setswitchinterval(previous)
+    assert errors == []
+
+
+def test_circuit_opens_after_repeated_failures_and_half_opens_after_cooldown():
+    backend = OllamaBackend("http://a", failure_threshold=3, cooldown_s=0.0)
+    for _ in range(3):
+        backend.acquire()
+        backend.release(0.1, ok=False)
+    assert backend.circuit == OPEN
+    # Cooldown of zero: the next availability check lets one trial through
+    assert backend.available()
+    backend.acquire()
+    assert not backend.available()
+    backend.release(0.1, ok=True)
+    assert backend.circuit == CLOSED
+
+
+def test_slow_call_threshold_can_be_raised_per_call():
+    backend = OllamaBackend("http://a", failure_threshold=1, slow_call_s=1.0)
+    backend.acquire()
+    backend.release(200.0, ok=True, slow_call_s=300.0)
+    assert backend.circuit == CLOSED and backend.consecutive_failures == 0
+    backend.acquire()
+    backend.release(2.0, ok=True)
+    assert backend.circuit == OPEN
+
+
+def test_post_retries_5xx_on_another_backend(fake_ollama_servers):
+    failing, healthy = fake_ollama_servers(2)
+    failing.status = 500
+    pool = make_pool([failing, healthy])
+    for _ in range(4):
+        response = pool.post("/api/chat", json={"model": "m"})
+        assert response.status_code == 200
+    assert len(healthy.requests) == 4
+    assert all(backend.in_flight == 0 for backend in pool.backends)
+
+
+def test_non_idempotent_posts_are_not_retried(fake_ollama_servers):
+    failing, healthy = fake_ollama_servers(2)
+    failing.status = 500
+    pool = make_pool([failing, healthy])
+    statuses = {pool.post("/api/chat", json={}, idempotent=False).status_code for _ in range(4)}
+    assert statuses == {200, 500}
+
+
+def test_no_backend_available():
+    pool = OllamaPool(["http://a"])
+    pool.backends[0].healthy = False
+    with pytest.raises(NoBackendAvailable):
+        pool.pick()
+
+
+def test_stream_yields_lines_and_releases_the_backend(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    pool = make_pool([server])
+    lines = list(pool.stream("/api/chat", json={"stream": True}))
+    assert len(lines) == 3
+    assert pool.backends[0].in_flight == 0
+
+    server.status = 404
+    with pytest.raises(requests.HTTPError):
+        list(pool.stream("/api/chat", json={"stream": True}))
+    assert pool.backends[0].in_flight == 0 and pool.backends[0].consecutive_failures == 0
+
+
+def test_client_falls_back_to_default_model_and_streams(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    client = OllamaClient(pool=make_pool([server]), routes={"chat": ModelRoute(model="small", num_predict=8, slow_call_s=5.0)})
+    server.missing_models.add("small")
+    response = client._post("chat", "/api/chat", {"messages": []})
+    assert response.json()["message"]["content"] == f"hi from {client.model}"
+    assert "small" in client.unavailable_models
+    # The options sent to Ollama never include pool settings
+    assert server.requests[-1][1]["options"] == {"num_predict": 8}
+
+    chunks = list(client._stream("chat", "/api/chat", {"messages": [], "stream": True}))
+    assert "".join(chunk["message"]["content"] for chunk in chunks) == "one two"
+    assert client.metrics["chat"]["completion_tokens"] == 5
+
+
+def test_generation_slots_are_shared_across_requests():
+    pool = OllamaPool(["http://a", "http://b"], slots_per_backend=2)
+    running = peak = 0
+
+    async def generate():
+        nonlocal running, peak
+        async with pool.generation_slots:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def two_batches():
+        await asyncio.gather(*(generate() for _ in range(6)), *(generate() for _ in range(6)))
+
+    asyncio.run(two_batches())
+    assert pool.generation_slots is pool.generation_slots
+    assert peak == pool.capacity == 4
@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from ollama_client import OllamaClient, ModelRoute
+from conftest import make_pool
+
+ROUTES = {"chat": ModelRoute(model="small"), "plan_generation": ModelRoute(model="big"), "embedding": ModelRoute(model="embed")}
+
+
+def make_client(servers):
+    client = OllamaClient(pool=make_pool(servers), routes=ROUTES)
+    client.model = "big"
+    return client
+
+
+def loaded_models(server):
+    return sorted(body["model"] for _, body in server.requests)
+
+
+def test_warm_up_loads_every_route_model_on_every_backend(fake_ollama_servers):
+    servers = fake_ollama_servers(2)
+    client = make_client(servers)
+    result = client.warm_up()
+    assert result["state"] == "done" and not result["errors"]
+    assert result["loaded"] == {model: [server.url for server in servers] for model in ("small", "big", "embed")}
+    assert loaded_models(servers[0]) == ["big", "embed", "small"]
+    assert servers[0].requests[-1] == ("/api/embed", {"model": "embed", "input": "", "keep_alive": -1})
+    assert client.is_ready()
+
+
+def test_warm_up_falls_back_when_a_route_model_is_missing(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.missing_models.add("small")
+    client = make_client([server])
+    result = client.warm_up()
+    assert result["state"] == "done"
+    assert "small" not in result["loaded"] and "big" in result["loaded"]
+    assert result["errors"] == {f"small@{server.url}": "HTTP 404"}
+    assert client.unavailable_models == {"small"}
+
+
+def test_warm_up_fails_while_backends_error(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    server.status = 500
+    client = make_client([server])
+    result = client.warm_up()
+    assert result["state"] == "failed" and result["loaded"] == {}
+    assert set(result["errors"]) == {f"{model}@{server.url}" for model in ("small", "big", "embed")}
+    assert not client.is_ready()
+
+
+def test_not_ready_until_a_backend_has_been_probed(fake_ollama_servers):
+    server, = fake_ollama_servers(1)
+    client = make_client([server])
+    client.warmup["state"] = "skipped"
+    assert not client.is_ready()
+    client.pool.check_health()
+    assert client.is_ready()
+
+    server.close()
+    client.pool.check_health()
+    assert not client.is_ready()
+
+
+@pytest.fixture
+def app_client(monkeypatch, fake_ollama_servers):
+    import main
+    server, = fake_ollama_servers(1)
+    client = make_client([server])
+    monkeypatch.setattr(main, "ollama_client", client)
+    # Without `with`, TestClient skips the lifespan: no warm-up or background health checks
+    return TestClient(app), client
+
+
+def test_ready_versus_health(app_client):
+    http, client = app_client
+    client.warmup["state"] = "skipped"
+    assert http.get("/health").json() == {"status": "healthy"}
+    response = http.get("/ready")
+    assert response.status_code == 503 and response.json()["healthy_backends"] == 0
+
+    client.pool.check_health()
+    response = http.get("/ready")
+    assert response.status_code == 200 and response.json()["status"] == "ready"
+
+    client.warmup["state"] = "running"
+    assert http.get("/ready").status_code == 503
+    assert http.get("/health").status_code == 200
@@ -0,0 +1,23 @@
+from fastapi.testclient import TestClient
+from main import app, mcp_server, ollama_client
+from conftest import make_project
+
+
+def test_replan_keeps_current_step_separate_from_splice_position(monkeypatch):
+    calls = {}
+
+    def plan_remaining_steps(description, completed_steps, current_step, remaining_steps, available_tools, reason):
+        calls.update(completed=completed_steps, current=current_step, remaining=remaining_steps)
+        return {"title": "T", "steps": [{"title": "New", "description": "", "required_tools": []}]}
+
+    monkeypatch.setattr(ollama_client, "plan_remaining_steps", plan_remaining_steps)
+    project = make_project("replan-test", step_count=5, current_step=2, completed=3)
+    mcp_server.add_project(project)
+
+    response = TestClient(app).post("/api/projects/replan-test/replan", json={"reason": "drill broke"})
+    assert response.status_code == 200
+    assert calls["current"]["title"] == "Step 2"
+    assert [step["title"] for step in calls["completed"]] == ["Step 1", "Step 3"]
+    assert [step["title"] for step in calls["remaining"]] == ["Step 4", "Step 5"]
+    assert response.json()["replaced_from"] == 4
+    assert [step.title for step in mcp_server.projects_db["replan-test"].steps] == ["Step 1", "Step 2", "Step 3", "New"]
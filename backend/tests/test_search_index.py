@@ -0,0 +1,65 @@
+from models import HouseObject
+from search_index import SearchIndex, tokenize
+from conftest import make_tool, make_step, make_project
+
+
+def make_index():
+    index = SearchIndex()
+    index.index_tool(make_tool("drill", "Cordless Drill", "Power Tools", icon_keywords=["drilling"]))
+    index.index_tool(make_tool("driver", "Impact Driver", "Power Tools"))
+    index.index_tool(make_tool("saw", "Circular Saw", "Power Tools", icon_keywords=["cutting", "drill"]))
+    index.index_house_object(HouseObject(id="shelf", name="Bookshelf", location="Living Room", type="furniture", properties={}))
+    return index
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("Drill the 6mm holes, with care!") == ["drill", "6mm", "holes", "care"]
+
+
+def test_prefix_matches_rank_below_exact_matches():
+    results = make_index().search("dri")
+    assert {result["id"] for result in results} == {"drill", "driver", "saw"}
+
+    results = make_index().search("drill")
+    # Exact title hit beats the exact keyword hit, which beats the prefix-only "drilling"
+    assert [result["id"] for result in results] == ["drill", "saw"]
+
+
+def test_every_token_must_match():
+    index = make_index()
+    assert [result["id"] for result in index.search("cordless dri")] == ["drill"]
+    assert index.search("cordless saw") == []
+    assert index.search("the and") == []
+
+
+def test_rare_terms_outweigh_common_ones():
+    index = SearchIndex()
+    for i in range(5):
+        index.index_tool(make_tool(f"clamp{i}", f"Bar Clamp {i}", "Power Tools"))
+    index.index_tool(make_tool("router", "Router", "Power Tools"))
+    scores = {result["id"]: result["score"] for result in index.search("r")}
+    # "router" appears once, "bar" in five documents: IDF favours the rare term
+    assert max(scores, key=scores.get) == "router"
+
+
+def test_kinds_filter_and_limit():
+    index = make_index()
+    assert [result["kind"] for result in index.search("living")] == ["house_object"]
+    assert index.search("living", kinds={"tool"}) == []
+    assert len(index.search("dri", limit=1)) == 1
+
+
+def test_reindexing_drops_stale_terms_and_steps():
+    index = make_index()
+    index.index_tool(make_tool("drill", "Hammer Drill"))
+    assert index.search("cordless") == []
+    assert index.search("hammer")[0]["id"] == "drill"
+
+    project = make_project("p1", steps=[make_step(1, "Sand the deck")], title="Deck refresh", description="Weekend job")
+    index.index_project(project)
+    hit = index.search("sand")[0]
+    assert (hit["kind"], hit["id"], hit["project_id"], hit["step_number"]) == ("step", "s1", "p1", 1)
+    project.steps = []
+    index.on_mcp_event("project_steps_changed", project)
+    assert index.search("sand") == []
+    assert "sand" not in index.vocabulary
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+from ollama_client import ollama_client, PLAN_SCHEMA
+from speculative_planner import SpeculativePlanner
+
+
+def test_invalidated_generation_stops_its_thread_before_the_next_starts(monkeypatch):
+    running = []
+    max_running = []
+    cancelled = []
+    lock = threading.Lock()
+
+    def plan_project_steps(description, tools, tools_context=None, cancel=None):
+        with lock:
+            running.append(description)
+            max_running.append(len(running))
+        stopped = cancel.wait(timeout=2)
+        cancelled.append(stopped)
+        with lock:
+            running.remove(description)
+        return {"error": "Plan generation cancelled"} if stopped else {"title": description, "steps": []}
+
+    monkeypatch.setattr(ollama_client, "plan_project_steps", plan_project_steps)
+
+    async def scenario():
+        planner = SpeculativePlanner(enabled=True, idle_poll_s=0.01)
+        planner._start("p1", "first")
+        while not running:
+            await asyncio.sleep(0.01)
+        planner.on_inventory_event("tool_added", None)
+        planner._start("p2", "second")
+        await asyncio.sleep(0.05)
+        assert running == ["second"]
+        plan = planner.plans["p2"]
+        plan.cancel.set()
+        await asyncio.gather(plan.task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert max(max_running) == 1
+    assert cancelled == [True, True]
+    assert not running
+
+
+def test_cancelled_plan_generation_closes_the_stream(monkeypatch):
+    cancel = threading.Event()
+    closed = []
+
+    def fake_stream(route_name, endpoint, payload):
+        assert payload["stream"] is True and payload["format"] == PLAN_SCHEMA
+        try:
+            for piece in ('{"title": ', '"Shelf", ', '"steps": []}'):
+                yield {"response": piece}
+                cancel.set()
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(ollama_client, "_stream", fake_stream)
+    result = ollama_client._generate_plan("plan_generation", "prompt", cancel)
+    assert result == {"error": "Plan generation cancelled"}
+    assert closed == [True]
+
+
+def test_streamed_plan_generation_without_cancel_parses(monkeypatch):
+    def fake_stream(route_name, endpoint, payload):
+        for piece in ('{"title": "Shelf", "steps": [', '{"title": "Drill", "description": "d", "required_tools": []}', ']}'):
+            yield {"response": piece}
+
+    monkeypatch.setattr(ollama_client, "_stream", fake_stream)
+    result = ollama_client._generate_plan("plan_generation", "prompt", threading.Event())
+    assert result["title"] == "Shelf" and result["steps"][0]["title"] == "Drill"
@@ -0,0 +1,80 @@
+import hashlib
+from tool_index import ToolEmbeddingIndex
+from conftest import make_tool, make_step
+
+
+def word_embed(texts):
+    """Bag-of-words vectors: texts sharing words are similar, others are orthogonal"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for word in text.lower().replace(".", " ").replace(",", " ").split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def test_exact_name_match():
+    index = ToolEmbeddingIndex(word_embed)
+    index.upsert(make_tool("h", "Hammer"))
+    assert index.resolve(["  hammer "])["  hammer "] == {"tool_id": "h", "score": 1.0, "owned": True}
+
+
+def test_tool_added_after_a_cached_miss_is_found():
+    index = ToolEmbeddingIndex(word_embed, threshold=0.3)
+    index.upsert(make_tool("h", "Hammer"))
+    assert not index.resolve(["Drill"])["Drill"]["owned"]
+    assert not index.resolve(["Drill"])["Drill"]["owned"]
+
+    index.upsert(make_tool("d", "Power Drill"))
+    result = index.resolve(["Drill"])["Drill"]
+    assert result["tool_id"] == "d" and result["owned"]
+    assert not index.pending
+
+
+def test_removed_tool_is_no_longer_matched():
+    index = ToolEmbeddingIndex(word_embed)
+    index.upsert(make_tool("h", "Hammer"))
+    index.upsert(make_tool("s", "Saw"))
+    assert index.resolve(["hammer"])["hammer"]["owned"]
+    index.remove("h")
+    assert not index.resolve(["hammer"])["hammer"]["owned"]
+    assert index.tool_ids == ["s"] and index.rows == {"s": 0}
+
+
+def test_failed_embedding_keeps_exact_matches():
+    def broken(texts):
+        raise RuntimeError("ollama down")
+
+    index = ToolEmbeddingIndex(broken)
+    index.upsert(make_tool("h", "Hammer"))
+    results = index.resolve(["Hammer", "Chisel"])
+    assert results["Hammer"]["owned"]
+    assert results["Chisel"] == {"tool_id": None, "score": 0.0, "owned": False}
+
+
+def test_link_required_tools_sets_missing_tools():
+    index = ToolEmbeddingIndex(word_embed)
+    index.upsert(make_tool("h", "Hammer"))
+    step = make_step(1, "Nail", required_tools=["Hammer", "Nail gun"])
+    index.link_required_tools([step])
+    assert step.required_tools == ["h", "Nail gun"]
+    assert step.missing_tools == ["Nail gun"]
+
+
+def test_tool_changed_during_embedding_stays_pending():
+    index = ToolEmbeddingIndex(None)
+
+    def embed_and_edit(texts):
+        # An inventory event arrives on the loop while the worker thread waits on Ollama
+        if any(text.startswith("Hammer") for text in texts):
+            index.upsert(make_tool("h", "Claw Hammer"))
+            index.upsert(make_tool("s", "Saw"))
+        return word_embed(texts)
+
+    index.embed = embed_and_edit
+    index.upsert(make_tool("h", "Hammer"))
+    index.refresh()
+    assert set(index.pending) == {"h", "s"}
+    index.refresh()
+    assert not index.pending and index.size == 2
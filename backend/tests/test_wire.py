@@ -0,0 +1,91 @@
+import gzip
+import json
+import zlib
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+import wire
+
+
+def make_app():
+    app = FastAPI(default_response_class=wire.FastJSONResponse)
+    app.add_middleware(wire.CompressionMiddleware)
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/large")
+    async def large():
+        return {"items": ["x" * 20] * 200}
+
+    @app.get("/stream")
+    async def stream():
+        async def lines():
+            for i in range(3):
+                yield json.dumps({"line": i, "pad": "y" * 50}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/precompressed")
+    async def precompressed():
+        body = gzip.compress(b"z" * 5000)
+        return StreamingResponse(iter([body]), headers={"Content-Encoding": "gzip"})
+
+    return app
+
+
+client = TestClient(make_app())
+
+
+def test_small_responses_are_not_compressed():
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"ok": True}
+
+
+def test_large_responses_are_gzipped_with_content_length():
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) == response.num_bytes_downloaded < len(response.content)
+    assert response.json() == {"items": ["x" * 20] * 200}
+
+
+def test_identity_clients_get_plain_bodies():
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.num_bytes_downloaded == len(response.content)
+
+
+def test_streamed_bodies_are_compressed_chunk_by_chunk():
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    # Every chunk is sync-flushed, so the first line decodes on its own
+    first = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(raw[:len(raw) // 2])
+    assert first.startswith(b'{"line": 0')
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line)["line"] for line in lines] == [0, 1, 2]
+
+
+def test_already_encoded_responses_pass_through():
+    response = client.get("/precompressed", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == b"z" * 5000
+
+
+def test_negotiate_encoding():
+    assert wire.negotiate_encoding("gzip, deflate") == "gzip"
+    assert wire.negotiate_encoding("gzip;q=0, deflate") is None
+    assert wire.negotiate_encoding("") is None
+    expected_br = "br" if wire.brotli is not None else "gzip"
+    assert wire.negotiate_encoding("br, gzip") == expected_br
+
+
+def test_frame_schemas():
+    frame = {"type": "ai_response", "content": "hi", "timestamp": 5, "extra": None}
+    assert json.loads(wire.encode_frame(frame)) == frame
+    assert json.loads(wire.encode_frame(frame, compact=True)) == {"t": "r", "c": "hi", "ts": 5}
+    assert json.loads(wire.encode_token_frame('a"b', compact=True)) == {"t": "k", "c": 'a"b'}
+    assert json.loads(wire.encode_token_frame("x")) == {"type": "ai_token", "content": "x"}
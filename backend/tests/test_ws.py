@@ -0,0 +1,65 @@
+import asyncio
+import json
+from fastapi.testclient import TestClient
+from main import app, mcp_server, ollama_client
+
+
+def fake_stream(message, context=None, mcp_server=None, conversation_history=None):
+    yield "Great, "
+    yield "let's start."
+
+
+def receive_until(ws, last_type, key="type"):
+    frames = []
+    while True:
+        frames.append(ws.receive_json())
+        if frames[-1][key] == last_type:
+            return frames
+
+
+def test_streamed_reply_adds_tools_on_the_event_loop(monkeypatch):
+    monkeypatch.setattr(ollama_client, "stream_chat_with_mcp", fake_stream)
+    on_loop = []
+
+    def listener(event, item):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+
+    mcp_server.subscribe(listener)
+    try:
+        with TestClient(app).websocket_connect("/ws") as ws:
+            ws.send_text(json.dumps({"content": "yes i have a ratchet", "context": {}, "stream": True}))
+            frames = receive_until(ws, "ai_response")
+    finally:
+        mcp_server._listeners.remove(listener)
+
+    assert on_loop == [True]
+    assert all(frame["type"] == "ai_token" for frame in frames[:-1])
+    assert frames[-1]["content"].startswith("Great, let's start.\n\n✅ I've added these tools to your toolroom inventory: Ratchet")
+    assert isinstance(frames[-1]["timestamp"], int)
+
+
+def test_compact_frames(monkeypatch):
+    monkeypatch.setattr(ollama_client, "stream_chat_with_mcp", fake_stream)
+    with TestClient(app).websocket_connect("/ws?frames=compact") as ws:
+        ws.send_text(json.dumps({"content": "hello", "context": {}, "stream": True}))
+        frames = receive_until(ws, "e", key="t")
+    assert "".join(frame["c"] for frame in frames[:-1]) == "Great, let's start."
+    assert set(frames[-1]) == {"t", "ts"}
+
+
+def test_stream_errors_are_reported_without_touching_the_inventory(monkeypatch):
+    def failing_stream(*args, **kwargs):
+        raise RuntimeError("ollama down")
+        yield
+
+    monkeypatch.setattr(ollama_client, "stream_chat_with_mcp", failing_stream)
+    tools_before = len(mcp_server.tools_db)
+    with TestClient(app).websocket_connect("/ws") as ws:
+        ws.send_text(json.dumps({"content": "i have a plunger", "context": {}, "stream": True}))
+        frames = receive_until(ws, "ai_response")
+    assert frames[-1]["content"] == "Error: ollama down"
+    assert len(mcp_server.tools_db) == tools_before
@@ -0,0 +1,252 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from models import Tool, ProjectStep
+from mcp_server import mcp_server
+from ollama_client import ollama_client
+
+# numpy is imported on first lookup rather than at startup
+np = None
+
+def _numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+# Cosine similarity below which a required tool is flagged as not owned
+DEFAULT_THRESHOLD = 0.75
+
+
+class ToolEmbeddingIndex:
+    """
+    Embedding index over the toolroom for mapping free-text tool names to tool IDs.
+
+    Vectors are unit-normalized float32 rows of a single matrix, so a whole plan's
+    required tools resolve with one matrix product. Inventory mutations only mark
+    tools as pending; they are embedded together on the next query.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]], threshold: float = DEFAULT_THRESHOLD, cache_size: int = 1024):
+        self.embed = embed
+        self.threshold = threshold
+        self.cache_size = cache_size
+
+        self.tool_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.texts: Dict[str, str] = {}
+        self.name_keys: Dict[str, str] = {}
+        self._buffer: Optional[np.ndarray] = None
+        self.size = 0
+        self.pending: Dict[str, str] = {}
+        self.version = 0
+
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._result_cache: Dict[str, tuple] = {}
+        self._result_cache_version = 0
+        # resolve() runs in worker threads while inventory events arrive on the event loop
+        self._lock = threading.RLock()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        _numpy()
+        if self._buffer is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._buffer[:self.size]
+
+    @staticmethod
+    def tool_text(tool: Tool) -> str:
+        keywords = ", ".join(tool.icon_keywords or [])
+        return f"{tool.name}. Category: {tool.category}. Keywords: {keywords}"
+
+    @staticmethod
+    def name_key(name: str) -> str:
+        return " ".join(name.lower().split())
+
+    def on_inventory_event(self, event: str, item):
+        """MCP server listener: queue added/changed tools for embedding"""
+        if event in ("tool_added", "tool_updated"):
+            self.upsert(item)
+        elif event == "tool_removed":
+            self.remove(item.id)
+
+    def upsert(self, tool: Tool):
+        with self._lock:
+            self._upsert(tool)
+
+    def _upsert(self, tool: Tool):
+        text = self.tool_text(tool)
+        self.name_keys[self.name_key(tool.name)] = tool.id
+        if self.texts.get(tool.id) == text and tool.id in self.rows:
+            return
+        self.texts[tool.id] = text
+        self.pending[tool.id] = text
+        # Cached lookups may now have a better match
+        self.version += 1
+
+    def remove(self, tool_id: str):
+        with self._lock:
+            self._remove(tool_id)
+
+    def _remove(self, tool_id: str):
+        self.pending.pop(tool_id, None)
+        self.texts.pop(tool_id, None)
+        self.name_keys = {k: v for k, v in self.name_keys.items() if v != tool_id}
+        row = self.rows.pop(tool_id, None)
+        self.version += 1
+        if row is None:
+            return
+        # Move the last row into the hole so the matrix stays dense
+        last = self.size - 1
+        if row != last:
+            moved_id = self.tool_ids[last]
+            self._buffer[row] = self._buffer[last]
+            self.tool_ids[row] = moved_id
+            self.rows[moved_id] = row
+        self.tool_ids.pop()
+        self.size -= 1
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _ensure_capacity(self, rows_needed: int, dim: int):
+        if self._buffer is not None and self._buffer.shape[1] != dim:
+            # Embedding model changed: every stored vector is stale
+            print(f"Embedding dimension changed to {dim}, re-embedding {len(self.texts)} tools")
+            self.pending.update(self.texts)
+            self._buffer, self.size, self.tool_ids, self.rows = None, 0, [], {}
+            self._query_cache.clear()
+        if self._buffer is None:
+            self._buffer = np.empty((max(16, rows_needed), dim), dtype=np.float32)
+        elif rows_needed > self._buffer.shape[0]:
+            grown = np.empty((max(rows_needed, 2 * self._buffer.shape[0]), dim), dtype=np.float32)
+            grown[:self.size] = self._buffer[:self.size]
+            self._buffer = grown
+
+    def refresh(self):
+        """
+        Embed every pending tool in one batch. The embedding call runs without the
+        lock, so inventory listeners on the event loop never wait on Ollama.
+        """
+        with self._lock:
+            batch = dict(self.pending)
+        if not batch:
+            return
+        _numpy()
+        vectors = self._normalize(np.asarray(self.embed(list(batch.values())), dtype=np.float32))
+        with self._lock:
+            dimension_changed = self._buffer is not None and self._buffer.shape[1] != vectors.shape[1]
+            self._ensure_capacity(self.size + len(batch), vectors.shape[1])
+            if not dimension_changed:
+                for (tool_id, text), vector in zip(batch.items(), vectors):
+                    # Tools removed or renamed while we were embedding keep their newer state
+                    if self.texts.get(tool_id) != text:
+                        continue
+                    if self.pending.get(tool_id) == text:
+                        del self.pending[tool_id]
+                    row = self.rows.get(tool_id)
+                    if row is None:
+                        row = self.size
+                        self.rows[tool_id] = row
+                        self.tool_ids.append(tool_id)
+                        self.size += 1
+                    self._buffer[row] = vector
+                self.version += 1
+        if dimension_changed:
+            # Every stored vector was re-queued; embed the full set with the new model
+            self.refresh()
+
+    def _query_vectors(self, keys: List[str]) -> np.ndarray:
+        with self._lock:
+            missing = [key for key in keys if key not in self._query_cache]
+        vectors = self._normalize(np.asarray(self.embed(missing), dtype=np.float32)) if missing else []
+        with self._lock:
+            for key, vector in zip(missing, vectors):
+                self._query_cache[key] = vector
+            for key in keys:
+                self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.cache_size:
+                self._query_cache.popitem(last=False)
+            return np.stack([self._query_cache[key] for key in keys])
+
+    def resolve(self, names: List[str], threshold: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Match tool names against the inventory in one batched pass.
+        Returns {name: {"tool_id", "score", "owned"}}; exact name matches score 1.0.
+        Blocks on the embedding model, so call it from a worker thread.
+        """
+        _numpy()
+        threshold = self.threshold if threshold is None else threshold
+        try:
+            # Embed pending tools before consulting cached results, which may predate them
+            self.refresh()
+        except Exception as e:
+            print(f"Tool embedding refresh failed: {e}")
+
+        with self._lock:
+            if self._result_cache_version != self.version:
+                self._result_cache.clear()
+                self._result_cache_version = self.version
+            to_search: List[str] = []
+            for name in dict.fromkeys(names):
+                key = self.name_key(name)
+                if key in self.name_keys:
+                    self._result_cache[key] = (self.name_keys[key], 1.0)
+                if key not in self._result_cache:
+                    to_search.append(key)
+
+        if to_search:
+            try:
+                query = self._query_vectors(to_search) if self.size else None
+                with self._lock:
+                    if query is not None and self.size:
+                        scores = query @ self.matrix.T
+                        best_rows = scores.argmax(axis=1)
+                        best_scores = scores[np.arange(len(to_search)), best_rows]
+                        for key, row, score in zip(to_search, best_rows, best_scores):
+                            self._result_cache[key] = (self.tool_ids[row], float(score))
+                    else:
+                        for key in to_search:
+                            self._result_cache[key] = (None, 0.0)
+            except Exception as e:
+                # Without embeddings only exact name matches can be trusted
+                print(f"Tool embedding lookup failed: {e}")
+
+        results: Dict[str, Dict] = {}
+        with self._lock:
+            for name in names:
+                tool_id, score = self._result_cache.get(self.name_key(name), (None, 0.0))
+                results[name] = {"tool_id": tool_id, "score": round(score, 4), "owned": tool_id is not None and score >= threshold}
+        return results
+
+    def link_required_tools(self, steps: List[ProjectStep], threshold: Optional[float] = None):
+        """
+        Replace each step's required tool names with inventory tool IDs in place.
+        Names without a confident match are kept as-is and listed in missing_tools.
+        """
+        names = [name for step in steps for name in step.required_tools]
+        matches = self.resolve(names, threshold) if names else {}
+        for step in steps:
+            resolved, missing = [], []
+            for name in step.required_tools:
+                match = matches.get(name)
+                if match and match["owned"]:
+                    if match["tool_id"] not in resolved:
+                        resolved.append(match["tool_id"])
+                else:
+                    resolved.append(name)
+                    missing.append(name)
+            step.required_tools = resolved
+            step.missing_tools = missing
+
+
+# Global tool index, kept in sync with the MCP server's toolroom
+tool_index = ToolEmbeddingIndex(ollama_client.embed)
+for _tool in mcp_server.tools_db.values():
+    tool_index.upsert(_tool)
+mcp_server.subscribe(tool_index.on_inventory_event)
@@ -0,0 +1,174 @@
+import time
+import zlib
+from typing import Any, Dict, Optional
+from pydantic_core import to_json
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+# Response-path encoding: Rust-backed JSON serialization, negotiated HTTP compression
+# and the WebSocket frame schemas.
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is used when brotli isn't installed
+    brotli = None
+
+# Bodies smaller than this go out uncompressed; the headers would eat most of the gain
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Quality 4 is brotli's sweet spot for on-the-fly compression (11 is meant for static assets)
+BROTLI_QUALITY = 4
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize models, lists and dicts straight to JSON bytes"""
+    return to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by pydantic-core. Endpoints returning large collections
+    build it directly so FastAPI skips its jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Incremental gzip/brotli stream; each chunk is flushed so streamed lines arrive promptly"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compresses HTTP responses with br (if available) or gzip, as negotiated by
+    Accept-Encoding. Complete bodies under minimum_size are sent as-is; streamed
+    bodies (NDJSON) are always compressed, chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compression pays off
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if "content-encoding" in headers or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(start_message)
+                else:
+                    body = compressor.chunk(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+            data = compressor.chunk(body) if body else b""
+            if not more_body:
+                data += compressor.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+# Compact WebSocket frame schema, opted into per connection with /ws?frames=compact
+COMPACT_KEYS = {"type": "t", "content": "c", "timestamp": "ts"}
+COMPACT_TYPES = {
+    "ai_response": "r",
+    "ai_token": "k",
+    "ai_response_end": "e",
+    "import_progress": "p",
+}
+
+
+def timestamp_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def encode_frame(frame: Dict[str, Any], compact: bool = False) -> str:
+    """
+    Encode a /ws frame. The compact schema shortens the common keys and frame
+    types and drops empty fields; other keys pass through unchanged.
+    """
+    if compact:
+        frame = {
+            COMPACT_KEYS.get(key, key): COMPACT_TYPES.get(value, value) if key == "type" else value
+            for key, value in frame.items()
+            if value is not None
+        }
+    return to_json(frame).decode()
+
+
+def encode_token_frame(content: str, compact: bool = False) -> str:
+    """Streamed token frames are the hot path, so they are built directly in the wanted schema"""
+    frame = {"t": "k", "c": content} if compact else {"type": "ai_token", "content": content}
+    return to_json(frame).decode()